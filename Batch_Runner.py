@@ -0,0 +1,70 @@
+import argparse
+import functools
+import glob
+import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import Main
+import Main2
+from Initialization import Initialization
+from Cubic_Spline_Interpolation import smooth_track_path
+from Path_IO import PATH_SUFFIX, save_path
+
+TRACK_DIRECTORY = './Data/racetrack-database/tracks'
+DRIVERS = {'main': functools.partial(Main.plan_lap, export_segments=False), 'main2': functools.partial(Main2.plan_lap, export_segments=False)}
+
+def track_paths(tracks):
+    # Resolve track names or CSV paths to CSV paths, every bundled track when none are given
+    if not tracks:
+        return sorted(glob.glob(os.path.join(TRACK_DIRECTORY, '*.csv')))
+    return [track if track.endswith('.csv') else os.path.join(TRACK_DIRECTORY, f'{track}.csv') for track in tracks]
+
+def result_paths(output_directory, driver, track_path, seed):
+    # Files a job writes: the planned lap and its smoothed version, the latter written last
+    track_name = os.path.basename(track_path).split('.')[0]
+    prefix = os.path.join(output_directory, driver, f'{track_name}_seed{seed}')
+    return f'{prefix}_path{PATH_SUFFIX}', f'{prefix}_smoothened_path{PATH_SUFFIX}'
+
+def run_job(driver, track_path, seed, output_directory):
+    # Plan and smooth one lap of one track with one seed, then store both paths
+    init = Initialization(track_path)
+    path = DRIVERS[driver](init, seed=seed)
+    smoothed = smooth_track_path(init.track_name, path)
+    path_file, smoothed_file = result_paths(output_directory, driver, track_path, seed)
+    # save_path moves every file into place in one step, so an interrupted run never leaves a partial result behind
+    metadata = dict(track=init.track_name, driver=driver, seed=seed)
+    save_path(path_file, path, metadata)
+    save_path(smoothed_file, smoothed.path, dict(metadata, smoothing='cubic_spline'))
+    return smoothed_file
+
+def run_batch(tracks=None, seeds=(0, 1, 2), driver='main', workers=None, output_directory='./Data/batch_results'):
+    # Run every (track, seed) job that has no stored result yet, spread over a pool of worker processes.
+    # Returns the number of failed jobs.
+    os.makedirs(os.path.join(output_directory, driver), exist_ok=True)
+    jobs = [(track_path, seed) for track_path in track_paths(tracks) for seed in seeds]
+    pending = [(track_path, seed) for track_path, seed in jobs
+               if not all(os.path.exists(file_path) for file_path in result_paths(output_directory, driver, track_path, seed))]
+    print(f"{len(jobs) - len(pending)} of {len(jobs)} jobs already done, running {len(pending)}")
+    failures = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_job, driver, track_path, seed, output_directory): (track_path, seed) for track_path, seed in pending}
+        for future in as_completed(futures):
+            track_path, seed = futures[future]
+            try:
+                print(f"Done {track_path} seed {seed}: {future.result()}")
+            except Exception:
+                failures += 1
+                print(f"Failed {track_path} seed {seed}:\n{traceback.format_exc()}")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Plan racelines for many tracks and seeds, resuming an interrupted batch')
+    parser.add_argument('tracks', nargs='*', help='Track names or CSV paths, all bundled tracks when omitted')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2], help='Seeds to plan every track with')
+    parser.add_argument('--driver', choices=sorted(DRIVERS), default='main', help='Segment planner driver to use')
+    parser.add_argument('--workers', type=int, default=None, help='Number of jobs running at once, all cores by default')
+    parser.add_argument('--output-dir', default='./Data/batch_results', help='Directory the results are written to')
+    arguments = parser.parse_args()
+    sys.exit(1 if run_batch(arguments.tracks, arguments.seeds, arguments.driver, arguments.workers, arguments.output_dir) else 0)
@@ -0,0 +1,223 @@
+import argparse
+import contextlib
+import datetime
+import functools
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import Main
+import Main2
+from Batch_Runner import track_paths
+from Initialization import Initialization
+from Metrics import planner_counters
+
+# Benchmark of the planners: every configuration plans every track with fixed seeds, one job after another so that
+# the timings do not compete for cores, and the counters of every planner run are summed per job.
+
+RACELINE_DIRECTORY = './Data/racetrack-database/racelines'
+FORMAT_VERSION = 1  # Version of the result file layout
+CONFIGS = {
+    # Lap drivers by name, each called with an Initialization, a seed and the list the planner runs are recorded in
+    'main': functools.partial(Main.plan_lap, export_segments=False),
+    'main_box': functools.partial(Main.plan_lap, export_segments=False, sampler='box'),
+    'main_connect': functools.partial(Main.plan_lap, export_segments=False, engine='rrt_star_connect'),
+    'main_lap': functools.partial(Main.plan_lap, export_segments=False, engine='rrt_star_lap'),
+    'main2': functools.partial(Main2.plan_lap, export_segments=False),
+    'main2_arcs': functools.partial(Main2.plan_lap, export_segments=False, turning_radius=10),
+}
+# Largest increase of each job metric that compare accepts: (relative, absolute); a regression has to exceed both
+TOLERANCES = {
+    'wall_time': (0.10, 0.05),
+    'peak_memory': (0.10, 1 << 20),
+    'iterations': (0.05, 0),
+    'iterations_to_quality': (0.05, 0),
+    'collision_checks': (0.05, 0),
+    'nn_queries': (0.05, 0),
+    'length': (0.01, 0),
+}
+
+def path_length(points):
+    # Length of the polyline through the points
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    return float(np.sum(np.hypot(np.diff(points[:, 0]), np.diff(points[:, 1]))))
+
+def raceline_length(track_name):
+    # Length of the reference raceline of the track, None when there is none
+    raceline_path = os.path.join(RACELINE_DIRECTORY, f'{track_name}.csv')
+    if not os.path.exists(raceline_path):
+        return None
+    return path_length(np.loadtxt(raceline_path, delimiter=',', comments='#'))
+
+def job_counters(planners):
+    # Work done by the planner runs of one job, summed over all of them
+    counters = dict(planner_runs=len(planners), iterations=0, iterations_to_first_path=0, iterations_to_quality=0, collision_checks=0,
+                    checks_avoided=0, nn_queries=0)
+    for planner in planners:
+        for name, value in planner_counters(planner).items():
+            counters[name] += value
+    return counters
+
+def run_job(config, track_path, seed, trace_memory=False):
+    # Plan one lap of one track with one configuration and seed, and return its metrics.
+    # A lap the driver gives up on counts as a failed job; peak_memory is None when trace_memory is off.
+    # Tracing the memory slows planning down several times over, so only traced runs have comparable wall times.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        init = Initialization(track_path)
+        planners = []
+        error = None
+        path = []
+        if trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            path = CONFIGS[config](init, seed=seed, planners=planners)
+        except RuntimeError as exception:
+            error = str(exception)
+        wall_time = time.perf_counter() - started
+        peak_memory = None
+        if trace_memory:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    length = path_length(path) if error is None else None
+    reference = raceline_length(init.track_name)
+    result = dict(config=config, track=init.track_name, seed=seed, success=error is None, error=error, wall_time=wall_time,
+                  peak_memory=peak_memory, length=length, raceline_length=reference,
+                  length_ratio=None if length is None or not reference else length / reference)
+    result.update(job_counters(planners))
+    return result
+
+def summarize(results):
+    # Per-configuration totals and rates of the job results
+    summary = {}
+    for config in dict.fromkeys(result['config'] for result in results):
+        jobs = [result for result in results if result['config'] == config]
+        succeeded = [result for result in jobs if result['success']]
+        ratios = [result['length_ratio'] for result in succeeded if result['length_ratio'] is not None]
+        memory = [result['peak_memory'] for result in jobs if result['peak_memory'] is not None]
+        summary[config] = dict(
+            jobs=len(jobs),
+            success_rate=len(succeeded) / len(jobs),
+            wall_time=sum(result['wall_time'] for result in jobs),
+            iterations=sum(result['iterations'] for result in jobs),
+            iterations_to_quality=sum(result['iterations_to_quality'] for result in jobs),
+            collision_checks=sum(result['collision_checks'] for result in jobs),
+            nn_queries=sum(result['nn_queries'] for result in jobs),
+            peak_memory=max(memory) if memory else None,
+            mean_length_ratio=float(np.mean(ratios)) if ratios else None,
+        )
+    return summary
+
+def run_benchmark(configs=None, tracks=None, seeds=(0, 1, 2), trace_memory=False, output_file=None):
+    # Run every configuration on every track with every seed and write the results to output_file as JSON.
+    # configs: Names in CONFIGS, all of them when None
+    # tracks: Track names or CSV paths, every bundled track when None
+    # Returns the results.
+    configs = list(CONFIGS) if not configs else configs
+    for config in configs:
+        if config not in CONFIGS:
+            raise ValueError(f"Unknown configuration '{config}', expected one of {sorted(CONFIGS)}")
+    if output_file is None:
+        output_file = f"./Data/benchmarks/benchmark_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M')}.json"
+    results = []
+    for config in configs:
+        for track_path in track_paths(tracks):
+            for seed in seeds:
+                result = run_job(config, track_path, seed, trace_memory)
+                results.append(result)
+                status = 'ok' if result['success'] else f"failed: {result['error']}"
+                print(f"{config} {result['track']} seed {seed}: {result['wall_time']:.2f} s, {result['iterations']} iterations, {status}")
+    report = dict(version=FORMAT_VERSION, created=datetime.datetime.now().isoformat(timespec='seconds'),
+                  environment=dict(python=platform.python_version(), numpy=np.__version__, platform=platform.platform()),
+                  seeds=list(seeds), trace_memory=trace_memory, results=results, summary=summarize(results))
+    directory = os.path.dirname(output_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output_file, 'w') as file:
+        json.dump(report, file, indent=1)
+    print(f"Results written to {output_file}")
+    return report
+
+def load_report(file_path):
+    # Read a result file written by run_benchmark
+    with open(file_path) as file:
+        report = json.load(file)
+    if report.get('version') != FORMAT_VERSION:
+        raise ValueError(f"{file_path} has result format {report.get('version')}, expected {FORMAT_VERSION}")
+    return report
+
+def compare_reports(baseline, candidate, tolerances=TOLERANCES):
+    # Regressions of the candidate run against the baseline run, as messages. Jobs are matched by
+    # configuration, track and seed; a job that stopped succeeding is a regression, and the metrics of jobs
+    # that succeeded in both runs may not grow beyond their tolerances. Wall times are only compared when
+    # both runs traced memory or neither did.
+    if baseline['trace_memory'] != candidate['trace_memory']:
+        tolerances = {metric: tolerance for metric, tolerance in tolerances.items() if metric != 'wall_time'}
+    previous_results = {(result['config'], result['track'], result['seed']): result for result in baseline['results']}
+    regressions = []
+    for result in candidate['results']:
+        previous = previous_results.get((result['config'], result['track'], result['seed']))
+        if previous is None:
+            continue
+        job = f"{result['config']} {result['track']} seed {result['seed']}"
+        if previous['success'] and not result['success']:
+            regressions.append(f"{job}: failed ({result['error']})")
+        if not (previous['success'] and result['success']):
+            continue
+        for metric, (relative, absolute) in tolerances.items():
+            old, new = previous.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + relative) and new - old > absolute:
+                regressions.append(f"{job}: {metric} {old:.6g} -> {new:.6g} ({(new / old - 1) * 100 if old else np.inf:+.1f}%)")
+    for config, summary in candidate['summary'].items():
+        previous = baseline['summary'].get(config)
+        if previous is not None and summary['success_rate'] < previous['success_rate']:
+            regressions.append(f"{config}: success rate {previous['success_rate']:.2f} -> {summary['success_rate']:.2f}")
+    return regressions
+
+def print_comparison(baseline, candidate):
+    # Print the per-configuration totals of both runs side by side
+    print(f"{'config':<14}{'success':>16}{'wall time (s)':>24}{'to quality':>26}{'collision checks':>26}{'nn queries':>26}")
+    for config, summary in candidate['summary'].items():
+        previous = baseline['summary'].get(config)
+        if previous is None:
+            continue
+        print(f"{config:<14}{previous['success_rate']:>8.2f}{summary['success_rate']:>8.2f}"
+              f"{previous['wall_time']:>12.1f}{summary['wall_time']:>12.1f}"
+              f"{previous.get('iterations_to_quality', '-'):>13}{summary['iterations_to_quality']:>13}"
+              f"{previous['collision_checks']:>13}{summary['collision_checks']:>13}"
+              f"{previous['nn_queries']:>13}{summary['nn_queries']:>13}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the planners over the bundled tracks, or compare two benchmark runs')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='Run the benchmark')
+    run_parser.add_argument('tracks', nargs='*', help='Track names or CSV paths, all bundled tracks when omitted')
+    run_parser.add_argument('--configs', nargs='+', choices=sorted(CONFIGS), default=None, help='Configurations to run, all when omitted')
+    run_parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2], help='Seeds to plan every track with')
+    run_parser.add_argument('--output', default=None, help='Result file, ./Data/benchmarks/benchmark_<date>.json by default')
+    run_parser.add_argument('--memory', action='store_true', help='Also trace peak memory, which slows planning down several times over')
+    run_parser.add_argument('--log-level', default='ERROR', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'), help='Least severe planner log messages shown')
+    compare_parser = commands.add_parser('compare', help='Flag regressions of a run against a baseline run')
+    compare_parser.add_argument('baseline', help='Result file of the baseline run')
+    compare_parser.add_argument('candidate', help='Result file of the run to check')
+    compare_parser.add_argument('--time-tolerance', type=float, default=TOLERANCES['wall_time'][0], help='Largest relative wall time increase per job')
+    arguments = parser.parse_args()
+    if arguments.command == 'run':
+        logging.basicConfig(level=arguments.log_level, format='%(levelname)s %(name)s: %(message)s')
+        run_benchmark(arguments.configs, arguments.tracks, arguments.seeds, arguments.memory, arguments.output)
+    else:
+        baseline, candidate = load_report(arguments.baseline), load_report(arguments.candidate)
+        print_comparison(baseline, candidate)
+        regressions = compare_reports(baseline, candidate, dict(TOLERANCES, wall_time=(arguments.time_tolerance, TOLERANCES['wall_time'][1])))
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        print(f"{len(regressions)} regressions")
+        sys.exit(1 if regressions else 0)
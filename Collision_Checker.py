@@ -0,0 +1,264 @@
+from collections import OrderedDict
+
+import numpy as np
+
+def cross_product(p1, p2, p3):
+    # Calculate the cross product of vectors p1p2 and p1p3
+    return (p2[0] - p1[0]) * (p3[1] - p1[1]) - (p2[1] - p1[1]) * (p3[0] - p1[0])
+
+def is_point_on_segment(p1, p2, p):
+    # Check if point p lies on the line segment p1-p2
+    return min(p1[0], p2[0]) <= p[0] <= max(p1[0], p2[0]) and min(p1[1], p2[1]) <= p[1] <= max(p1[1], p2[1])
+
+def do_segments_intersect(p1, p2, p3, p4):
+    # Check if line segment p1-p2 intersects with line segment p3-p4 using the cross product method
+    d1 = cross_product(p3, p4, p1)
+    d2 = cross_product(p3, p4, p2)
+    d3 = cross_product(p1, p2, p3)
+    d4 = cross_product(p1, p2, p4)
+    if d1 * d2 < 0 and d3 * d4 < 0:
+        return True
+    if d1 == 0 and is_point_on_segment(p3, p4, p1):
+        return True
+    if d2 == 0 and is_point_on_segment(p3, p4, p2):
+        return True
+    if d3 == 0 and is_point_on_segment(p1, p2, p3):
+        return True
+    if d4 == 0 and is_point_on_segment(p1, p2, p4):
+        return True
+    return False
+
+def segments_intersect(p3, p4, segment_starts, segment_ends):
+    # Vectorized do_segments_intersect: test the query segment p3-p4 against arrays of segments.
+    # segment_starts, segment_ends: (..., 2) arrays of end points; p3, p4 broadcast against them.
+    # Returns a boolean array with one entry per segment, evaluated with the same arithmetic as
+    # do_segments_intersect so that both agree exactly, including the collinear cases.
+    p1x, p1y = segment_starts[..., 0], segment_starts[..., 1]
+    p2x, p2y = segment_ends[..., 0], segment_ends[..., 1]
+    p3 = np.asarray(p3, dtype=float)
+    p4 = np.asarray(p4, dtype=float)
+    p3x, p3y = p3[..., 0], p3[..., 1]
+    p4x, p4y = p4[..., 0], p4[..., 1]
+    d1 = (p4x - p3x) * (p1y - p3y) - (p4y - p3y) * (p1x - p3x)
+    d2 = (p4x - p3x) * (p2y - p3y) - (p4y - p3y) * (p2x - p3x)
+    d3 = (p2x - p1x) * (p3y - p1y) - (p2y - p1y) * (p3x - p1x)
+    d4 = (p2x - p1x) * (p4y - p1y) - (p2y - p1y) * (p4x - p1x)
+    intersect = (d1 * d2 < 0) & (d3 * d4 < 0)
+    on_query = lambda px, py: ((np.minimum(p3x, p4x) <= px) & (px <= np.maximum(p3x, p4x))
+                               & (np.minimum(p3y, p4y) <= py) & (py <= np.maximum(p3y, p4y)))
+    on_segment = lambda px, py: ((np.minimum(p1x, p2x) <= px) & (px <= np.maximum(p1x, p2x))
+                                 & (np.minimum(p1y, p2y) <= py) & (py <= np.maximum(p1y, p2y)))
+    intersect |= (d1 == 0) & on_query(p1x, p1y)
+    intersect |= (d2 == 0) & on_query(p2x, p2y)
+    intersect |= (d3 == 0) & on_segment(p3x, p3y)
+    intersect |= (d4 == 0) & on_segment(p4x, p4y)
+    return intersect
+
+def segments_intersect_matrix(query_starts, query_ends, segment_starts, segment_ends):
+    # Test Q query segments against M segments at once and return a (Q, M) boolean mask
+    query_starts = np.asarray(query_starts, dtype=float).reshape(-1, 1, 2)
+    query_ends = np.asarray(query_ends, dtype=float).reshape(-1, 1, 2)
+    return segments_intersect(query_starts, query_ends, segment_starts[np.newaxis], segment_ends[np.newaxis])
+
+
+class ObstacleSet:
+    # Obstacle boundaries kept as separate polylines, each explicitly open or closed,
+    # flattened once into arrays of segments for the collision code
+
+    def __init__(self, polylines):
+        # polylines: List of (points, closed) pairs, points being an (N, 2) sequence of boundary
+        #            points and closed telling whether the last point joins back to the first
+        self.polylines = [(np.asarray(points, dtype=float).reshape(-1, 2), bool(closed)) for points, closed in polylines]
+        starts, ends, polyline_ids, point_ids = [], [], [], []
+        for polyline_id, (points, closed) in enumerate(self.polylines):
+            count = len(points) if closed and len(points) > 2 else len(points) - 1
+            if count <= 0:
+                continue
+            starts.append(points[:count])
+            ends.append(np.roll(points, -1, axis=0)[:count])
+            polyline_ids.append(np.full(count, polyline_id, dtype=np.intp))
+            point_ids.append(np.arange(count, dtype=np.intp))
+        self.segment_starts = np.concatenate(starts) if starts else np.empty((0, 2))
+        self.segment_ends = np.concatenate(ends) if ends else np.empty((0, 2))
+        self.polyline_ids = np.concatenate(polyline_ids) if polyline_ids else np.empty(0, dtype=np.intp)  # polyline of each segment
+        self.point_ids = np.concatenate(point_ids) if point_ids else np.empty(0, dtype=np.intp)  # index of each segment's start point in its polyline
+        self.box_min = np.minimum(self.segment_starts, self.segment_ends)  # lower-left corner of each segment's bounding box
+        self.box_max = np.maximum(self.segment_starts, self.segment_ends)  # upper-right corner of each segment's bounding box
+        self.ranges = [(polyline_id, 0, len(points) - 1) for polyline_id, (points, closed) in enumerate(self.polylines)]
+
+    @classmethod
+    def from_points(cls, obstacles):
+        # Wrap a plain list of obstacle points, joined in order and closed back to the first point
+        return cls([(obstacles, True)])
+
+    def window(self, x_low, x_high, y_low, y_high):
+        # Return the obstacles whose segments overlap the given box, as open polylines cut from the
+        # original ones. ranges lists (polyline id, first point, last point) of each piece, where the
+        # last point may wrap past the end of a closed polyline.
+        inside = np.flatnonzero((self.box_min[:, 0] <= x_high) & (self.box_max[:, 0] >= x_low)
+                                & (self.box_min[:, 1] <= y_high) & (self.box_max[:, 1] >= y_low))
+        # Split the selected segments into runs of consecutive segments of the same polyline
+        breaks = np.flatnonzero((np.diff(self.polyline_ids[inside]) != 0) | (np.diff(self.point_ids[inside]) != 1)) + 1
+        pieces = []
+        ranges = []
+        for run in np.split(inside, breaks) if len(inside) else []:
+            polyline_id = int(self.polyline_ids[run[0]])
+            points, closed = self.polylines[polyline_id]
+            first = int(self.point_ids[run[0]])
+            last = int(self.point_ids[run[-1]]) + 1
+            pieces.append((points[np.arange(first, last + 1) % len(points)], False))
+            ranges.append((polyline_id, first, last))
+        windowed = ObstacleSet(pieces)
+        windowed.ranges = ranges
+        return windowed
+
+    def __len__(self):
+        # Number of obstacle segments
+        return len(self.segment_starts)
+
+    def segments(self):
+        # Yield every obstacle segment as a (start, end) pair of points
+        return zip(self.segment_starts, self.segment_ends)
+
+
+class CollisionChecker:
+    # Checks edges against obstacle segments. A uniform grid over the segment bounding boxes
+    # (broad phase) selects the few segments near an edge, which are then tested exactly.
+
+    def __init__(self, segment_starts, segment_ends, cell_size=20, scalar_limit=8, grid=None):
+        # segment_starts, segment_ends: (M, 2) arrays with the end points of the obstacle segments
+        # cell_size: Side length of a grid cell
+        # scalar_limit: Largest number of candidate segments tested with the scalar loop instead of the array kernel
+        # grid: grid_arrays() of a checker over the same segments and cell size, the grid is built here when not given
+        self.segment_starts = np.asarray(segment_starts, dtype=float).reshape(-1, 2)
+        self.segment_ends = np.asarray(segment_ends, dtype=float).reshape(-1, 2)
+        self.box_min = np.minimum(self.segment_starts, self.segment_ends)
+        self.box_max = np.maximum(self.segment_starts, self.segment_ends)
+        self.cell_size = cell_size
+        self.scalar_limit = scalar_limit
+        if grid is None:
+            self.build_grid()
+        else:
+            origin, shape, self.cell_segments, self.cell_offsets = grid
+            self.origin = np.asarray(origin, dtype=float)
+            self.shape = (int(shape[0]), int(shape[1]))
+
+    @classmethod
+    def from_obstacles(cls, obstacles, cell_size=20, grid=None):
+        # Build a checker over the segments of an ObstacleSet
+        return cls(obstacles.segment_starts, obstacles.segment_ends, cell_size=cell_size, grid=grid)
+
+    def grid_arrays(self):
+        # The grid as (origin, shape, cell_segments, cell_offsets), for storing it and passing it back as grid
+        return self.origin, self.shape, self.cell_segments, self.cell_offsets
+
+    def build_grid(self):
+        # Register every segment with each grid cell its bounding box overlaps, stored column-major
+        # so that the cells of one grid column form a contiguous run of segment ids
+        if len(self.segment_starts):
+            self.origin = self.box_min.min(axis=0)
+            extent = self.box_max.max(axis=0) - self.origin
+        else:
+            self.origin = np.zeros(2)
+            extent = np.zeros(2)
+        self.shape = (int(extent[0] // self.cell_size) + 1, int(extent[1] // self.cell_size) + 1)
+        low = self.cells_of(self.box_min)
+        high = self.cells_of(self.box_max)
+        cell_ids = []
+        segment_ids = []
+        for k in range(len(self.segment_starts)):
+            for i in range(low[k, 0], high[k, 0] + 1):
+                first = i * self.shape[1]
+                cell_ids.extend(range(first + low[k, 1], first + high[k, 1] + 1))
+                segment_ids.extend([k] * (high[k, 1] - low[k, 1] + 1))
+        cell_ids = np.array(cell_ids, dtype=np.intp)
+        order = np.argsort(cell_ids, kind='stable')
+        self.cell_segments = np.array(segment_ids, dtype=np.intp)[order]
+        self.cell_offsets = np.zeros(self.shape[0] * self.shape[1] + 1, dtype=np.intp)
+        np.cumsum(np.bincount(cell_ids, minlength=self.shape[0] * self.shape[1]), out=self.cell_offsets[1:])
+
+    def cells_of(self, points):
+        # Return the (column, row) grid cells of the given points, clamped to the grid
+        cells = np.floor((np.asarray(points, dtype=float) - self.origin) / self.cell_size).astype(np.intp)
+        return np.clip(cells, 0, np.array(self.shape) - 1)
+
+    def candidates(self, point1, point2):
+        # Return the ids of the segments whose bounding box overlaps the bounding box of the edge
+        edge_min = (min(point1[0], point2[0]), min(point1[1], point2[1]))
+        edge_max = (max(point1[0], point2[0]), max(point1[1], point2[1]))
+        (i_low, j_low), (i_high, j_high) = self.cells_of((edge_min, edge_max))
+        runs = []
+        for i in range(i_low, i_high + 1):
+            first = i * self.shape[1]
+            runs.append(self.cell_segments[self.cell_offsets[first + j_low]:self.cell_offsets[first + j_high + 1]])
+        ids = np.unique(np.concatenate(runs)) if len(runs) > 1 else np.unique(runs[0])
+        overlap = ((self.box_min[ids, 0] <= edge_max[0]) & (self.box_max[ids, 0] >= edge_min[0])
+                   & (self.box_min[ids, 1] <= edge_max[1]) & (self.box_max[ids, 1] >= edge_min[1]))
+        return ids[overlap]
+
+    def is_intersecting(self, point1, point2):
+        # Check if the line segment between point1 and point2 intersects with any obstacle segment
+        ids = self.candidates(point1, point2)
+        if len(ids) <= self.scalar_limit:
+            # A handful of candidates is cheaper to test one by one than through the array kernel
+            for k in ids:
+                if do_segments_intersect(self.segment_starts[k], self.segment_ends[k], point1, point2):
+                    return True
+            return False
+        return bool(segments_intersect(point1, point2, self.segment_starts[ids], self.segment_ends[ids]).any())
+
+    def intersecting_mask(self, points1, points2):
+        # Check many edges points1[k] - points2[k] at once and return a boolean mask of the ones
+        # that intersect any obstacle segment. points2 may also be a single point shared by all edges.
+        points1 = np.asarray(points1, dtype=float).reshape(-1, 2)
+        points2 = np.broadcast_to(np.asarray(points2, dtype=float), points1.shape)
+        if len(points1) == 0:
+            return np.zeros(0, dtype=bool)
+        ends = np.concatenate((points1, points2))
+        ids = self.candidates(ends.min(axis=0), ends.max(axis=0))
+        if len(ids) == 0:
+            return np.zeros(len(points1), dtype=bool)
+        return segments_intersect_matrix(points1, points2, self.segment_starts[ids], self.segment_ends[ids]).any(axis=1)
+
+
+class EdgeCache:
+    # Memo of edge collision results keyed by the ids of the two tree nodes joined by the edge,
+    # evicting the least recently used result once capacity results are stored
+
+    def __init__(self, capacity=4096, directed=False):
+        # capacity: Largest number of edge results kept
+        # directed: Key the results by (parent id, child id), for edges whose shape depends on the direction they are driven in
+        self.capacity = capacity
+        self.directed = directed
+        self.results = OrderedDict()
+        self.hits = 0  # Lookups answered from the cache
+        self.misses = 0  # Lookups of edges not in the cache
+
+    def get(self, node_id, other_id):
+        # Return whether the edge between the two nodes is collision-free, None when it is not stored
+        key = self.key(node_id, other_id)
+        free = self.results.get(key)
+        if free is None:
+            self.misses += 1
+            return None
+        self.results.move_to_end(key)
+        self.hits += 1
+        return free
+
+    def put(self, node_id, other_id, free):
+        # Store whether the edge between the two nodes is collision-free
+        key = self.key(node_id, other_id)
+        self.results[key] = free
+        self.results.move_to_end(key)
+        if len(self.results) > self.capacity:
+            self.results.popitem(last=False)
+
+    def key(self, node_id, other_id):
+        # Key of the edge between the two nodes, the same in both directions unless the cache is directed
+        if self.directed or node_id < other_id:
+            return (node_id, other_id)
+        return (other_id, node_id)
+
+    def __len__(self):
+        # Number of stored edge results
+        return len(self.results)
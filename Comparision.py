@@ -1,77 +1,202 @@
+import argparse
+import csv
+import glob
+import os
+import sys
+
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
+from scipy.spatial import cKDTree
+
+import Rendering
+from Path_IO import load_path
+
+# Comparison of generated paths against the reference racelines of their tracks. Both lines are resampled at the
+# same arc-length spacing, the lateral deviation of every sample is measured against the polyline of the other line
+# through a KD-tree over its samples, and the curvature of both lines is summarised.
+
+RACELINE_DIRECTORY = './Data/racetrack-database/racelines'
+PATH_DIRECTORY = './Data/smoothened_paths'
+COLUMNS = (
+    # Summary table columns after the file and track: (metric, heading, width, format)
+    ('length', 'length', 9, '.1f'),
+    ('length_ratio', 'ratio', 8, '.4f'),
+    ('mean_deviation', 'mean dev', 9, '.2f'),
+    ('rms_deviation', 'rms dev', 9, '.2f'),
+    ('max_deviation', 'max dev', 9, '.2f'),
+    ('hausdorff', 'hausdorff', 10, '.2f'),
+    ('mean_curvature', 'mean |k|', 10, '.4f'),
+    ('max_curvature', 'max |k|', 9, '.4f'),
+    ('raceline_max_curvature', 'ref max |k|', 12, '.4f'),
+)
 
-# Function to calculate the Euclidean distance between two points
 def euclidean_distance(p1, p2):
-    return np.sqrt((p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2)
+    # Euclidean distance between two points, or between the rows of two arrays of points
+    p1, p2 = np.asarray(p1, dtype=float), np.asarray(p2, dtype=float)
+    return np.hypot(p1[..., 0] - p2[..., 0], p1[..., 1] - p2[..., 1])
+
+def cumulative_distance(raceline):
+    # Distance along the polyline from its first point to every point
+    points = np.asarray(raceline, dtype=float).reshape(-1, 2)
+    return np.concatenate(([0.0], np.cumsum(euclidean_distance(points[1:], points[:-1]))))
 
-# Calculate total distance for a raceline
 def total_distance(raceline):
-    return sum(euclidean_distance(raceline[i], raceline[i+1]) for i in range(len(raceline) - 1))
+    # Length of the polyline
+    return float(cumulative_distance(raceline)[-1])
 
-# Calculate cumulative distance along the path
-def cumulative_distance(raceline):
-    distances = [0]
-    for i in range(1, len(raceline)):
-        distances.append(distances[-1] + euclidean_distance(raceline[i-1], raceline[i]))
-    return np.array(distances)
-
-# Read raceline1 from file
-raceline1 = pd.read_csv('./Data/racetrack-database/racelines/Shanghai.csv')
-# Read raceline2 from file
-raceline2 = []
-with open('./Data/smoothened_paths/Shanghai_2024-05-28_08-57_smoothened_path.txt', 'r') as file:
-    for line in file:
-        line = line.strip().strip('()')
-        x, y = line.split(',')
-        raceline2.append((float(x), float(y)))
-
-# Convert raceline1 to a list of tuples
-raceline1 = [(row['# x_m'], row['y_m']) for _, row in raceline1.iterrows()]
-
-# Ensure raceline1 and raceline2 have the same length
-if len(raceline1) != len(raceline2):
-    min_len = min(len(raceline1), len(raceline2))
-    raceline1 = raceline1[:min_len]
-    raceline2 = raceline2[:min_len]
-
-# Calculate total distances
-total_distance_raceline1 = total_distance(raceline1)
-total_distance_raceline2 = total_distance(raceline2)
-
-# Prepare data for cumulative distance calculation
-raceline1_x, raceline1_y = zip(*raceline1)
-raceline2_x, raceline2_y = zip(*raceline2)
-
-# Calculate cumulative distances
-distance_raceline1 = cumulative_distance(raceline1)
-distance_raceline2 = cumulative_distance(raceline2)
-
-# Create a DataFrame to display results
-df = pd.DataFrame({
-    'Point': list(range(len(raceline1))),
-    'Raceline 1': raceline1,
-    'Raceline 2': raceline2,
-    'Distance Raceline 1': distance_raceline1,
-    'Distance Raceline 2': distance_raceline2
-})
-
-# Display the results
-print(df)
-print(f"\nTotal distance for Raceline 1: {total_distance_raceline1} units")
-print(f"Total distance for Raceline 2: {total_distance_raceline2} units")
-
-# Plot the racelines for visual comparison
-plt.figure(figsize=(14, 7))
-
-plt.plot(raceline1_x, raceline1_y, 'g-', linewidth=2, label='Raceline 1')
-plt.plot(raceline2_x, raceline2_y, 'r-', linewidth=2, label='Raceline 2')
-plt.xlabel('X Coordinate')
-plt.ylabel('Y Coordinate')
-plt.title('Comparison of Racelines')
-plt.legend()
-plt.grid(True)
-
-plt.tight_layout()
-plt.show()
\ No newline at end of file
+def is_closed(points):
+    # A line is closed when its last point lies about one point spacing from the first
+    spacing = euclidean_distance(points[1:], points[:-1])
+    return bool(euclidean_distance(points[-1], points[0]) <= 2 * np.median(spacing))
+
+def resample(points, spacing, closed):
+    # Points at equal arc-length steps of about spacing along the polyline, joined back to the first point when closed.
+    # Returns the samples and the exact step between them.
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    # Repeated points would give zero-length steps that np.interp cannot order
+    keep = np.concatenate(([True], np.any(np.diff(points, axis=0) != 0, axis=1)))
+    points = points[keep]
+    if closed:
+        points = np.vstack((points, points[:1]))
+    station = cumulative_distance(points)
+    count = max(int(round(station[-1] / spacing)), 2)
+    # A closed line does not repeat its first point at the end
+    targets = np.linspace(0, station[-1], count, endpoint=not closed)
+    step = targets[1] - targets[0]
+    return np.column_stack((np.interp(targets, station, points[:, 0]), np.interp(targets, station, points[:, 1]))), step
+
+def curvature(points, step, closed):
+    # Signed curvature at every sample of a line resampled at equal steps, from central differences
+    if closed:
+        forward, backward = np.roll(points, -1, axis=0), np.roll(points, 1, axis=0)
+        first = (forward - backward) / (2 * step)
+        second = (forward - 2 * points + backward) / step**2
+    else:
+        first = np.gradient(points, step, axis=0)
+        second = np.gradient(first, step, axis=0)
+    speed = np.hypot(first[:, 0], first[:, 1])
+    return (first[:, 0] * second[:, 1] - first[:, 1] * second[:, 0]) / np.maximum(speed, 1e-12)**3
+
+
+class Polyline:
+    # A resampled line with a KD-tree over its samples, measuring the distance of points to the line
+
+    def __init__(self, points, spacing=1.0, closed=None):
+        # points: (N, 2) points of the line
+        # spacing: Arc-length step of the samples
+        # closed: Whether the last point joins back to the first, told from the points when None
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        self.closed = is_closed(points) if closed is None else closed
+        self.samples, self.step = resample(points, spacing, self.closed)
+        self.length = self.step * len(self.samples) if self.closed else self.step * (len(self.samples) - 1)
+        self.tree = cKDTree(self.samples)
+
+    def distances(self, points):
+        # Distance of every point to the line: the nearest sample is found in the KD-tree,
+        # then the point is projected onto the two segments meeting at that sample
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        _, nearest = self.tree.query(points)
+        count = len(self.samples)
+        best = None
+        for offset in (-1, 1):
+            other = nearest + offset
+            if self.closed:
+                other %= count
+            else:
+                other = np.clip(other, 0, count - 1)
+            start, end = self.samples[nearest], self.samples[other]
+            direction = end - start
+            length_squared = np.maximum(np.sum(direction**2, axis=1), 1e-12)
+            t = np.clip(np.sum((points - start) * direction, axis=1) / length_squared, 0, 1)
+            distance = euclidean_distance(points, start + t[:, np.newaxis] * direction)
+            best = distance if best is None else np.minimum(best, distance)
+        return best
+
+    def curvature(self):
+        # Signed curvature at every sample
+        return curvature(self.samples, self.step, self.closed)
+
+def compare(path, reference, spacing=1.0):
+    # Metrics of a path against a reference Polyline: lengths, lateral deviation of the path from the reference,
+    # the Hausdorff distance between both lines and the curvature of both
+    line = Polyline(path, spacing)
+    deviation = reference.distances(line.samples)
+    hausdorff = max(deviation.max(), line.distances(reference.samples).max())
+    path_curvature = np.abs(line.curvature())
+    reference_curvature = np.abs(reference.curvature())
+    return dict(
+        points=len(path), length=line.length, raceline_length=reference.length, length_ratio=line.length / reference.length,
+        mean_deviation=float(deviation.mean()), rms_deviation=float(np.sqrt(np.mean(deviation**2))), max_deviation=float(deviation.max()),
+        hausdorff=float(hausdorff), mean_curvature=float(path_curvature.mean()), max_curvature=float(path_curvature.max()),
+        raceline_mean_curvature=float(reference_curvature.mean()), raceline_max_curvature=float(reference_curvature.max()),
+    )
+
+def load_raceline(track_name, raceline_directory=RACELINE_DIRECTORY):
+    # (N, 2) points of the reference raceline of the track
+    return np.loadtxt(os.path.join(raceline_directory, f'{track_name}.csv'), delimiter=',', comments='#', ndmin=2)[:, :2]
+
+def track_of(file_path, saved):
+    # Track of a path file: stored in the metadata of binary files, the start of the file name otherwise
+    return saved.metadata.get('track') or os.path.basename(file_path).split('_')[0]
+
+def compare_files(file_paths, raceline_directory=RACELINE_DIRECTORY, spacing=1.0):
+    # Compare every path file with the raceline of its track. Each raceline is resampled once for all of its paths.
+    # Returns one row of metrics per file; files of tracks without a raceline get an error entry instead.
+    references = {}
+    rows = []
+    for file_path in file_paths:
+        saved = load_path(file_path)
+        track_name = track_of(file_path, saved)
+        row = dict(file=file_path, track=track_name)
+        if track_name not in references:
+            raceline_path = os.path.join(raceline_directory, f'{track_name}.csv')
+            references[track_name] = Polyline(load_raceline(track_name, raceline_directory), spacing) if os.path.exists(raceline_path) else None
+        if references[track_name] is None:
+            row['error'] = f"no raceline for {track_name}"
+        elif len(saved) < 2:
+            row['error'] = "fewer than two points"
+        else:
+            row.update(compare(saved.points, references[track_name], spacing))
+        rows.append(row)
+    return rows
+
+def print_table(rows):
+    # Print the metrics of every compared file as a table, one line per file
+    names = [os.path.basename(row['file']) for row in rows]
+    name_width = max(len(name) for name in names + ['file']) + 2
+    track_width = max(len(row['track']) for row in rows + [dict(track='track')]) + 2
+    print(f"{'file':<{name_width}}{'track':<{track_width}}" + ''.join(f"{heading:>{width}}" for metric, heading, width, spec in COLUMNS))
+    for name, row in zip(names, rows):
+        if 'error' in row:
+            print(f"{name:<{name_width}}{row['track']:<{track_width}}{row['error']}")
+            continue
+        print(f"{name:<{name_width}}{row['track']:<{track_width}}" + ''.join(f"{row[metric]:>{width}{spec}}" for metric, heading, width, spec in COLUMNS))
+
+def write_csv(file_path, rows):
+    # Write the metrics of every compared file to a CSV file
+    fields = list(dict.fromkeys(field for row in rows for field in row))
+    with open(file_path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare generated paths with the reference racelines of their tracks')
+    parser.add_argument('paths', nargs='*', help=f'Binary or text path files, every file in {PATH_DIRECTORY} when omitted')
+    parser.add_argument('--raceline-dir', default=RACELINE_DIRECTORY, help='Directory of the reference raceline CSV files')
+    parser.add_argument('--spacing', type=float, default=1.0, help='Arc-length step both lines are resampled at, in metres')
+    parser.add_argument('--csv', default=None, help='Also write the metrics to this CSV file')
+    parser.add_argument('--plot-dir', default=None, help='Write a plot of every path over its raceline to this directory')
+    arguments = parser.parse_args()
+    file_paths = arguments.paths or sorted(glob.glob(os.path.join(PATH_DIRECTORY, '*.txt')) + glob.glob(os.path.join(PATH_DIRECTORY, '*.npz')))
+    if not file_paths:
+        sys.exit(f"No path files found in {PATH_DIRECTORY}")
+    rows = compare_files(file_paths, arguments.raceline_dir, arguments.spacing)
+    print_table(rows)
+    if arguments.csv is not None:
+        write_csv(arguments.csv, rows)
+    if arguments.plot_dir is not None:
+        for row in rows:
+            if 'error' not in row:
+                name = os.path.splitext(os.path.basename(row['file']))[0]
+                Rendering.plot_comparison(load_raceline(row['track'], arguments.raceline_dir), load_path(row['file']).points, row['track'],
+                                          os.path.join(arguments.plot_dir, f'{name}.png'))
@@ -1,54 +1,129 @@
-import datetime
 import numpy as np
-from scipy.interpolate import CubicSpline
+from scipy.interpolate import CubicSpline, splev, splprep
+
+from Path_IO import path_file, save_path, timestamp
+
+# Exponent of the chord lengths summed into the spline parameter: uniform steps, square roots of the chords, chords
+PARAMETERIZATIONS = {'uniform': 0.0, 'centripetal': 0.5, 'chord': 1.0}
+
+def is_closed_loop(points):
+    """
+    Tells whether a path is a closed loop, its last point lying about one point spacing from the first.
+
+    :param points: An (N, 2) array of path points.
+    :return: True for a closed loop.
+    """
+    spacing = np.hypot(*np.diff(points, axis=0).T)
+    return bool(np.hypot(*(points[-1] - points[0])) <= 2 * np.median(spacing))
 
 class CubicSplineInterpolator:
-    def __init__(self, trackname, points):
+    # Samples of the arc-length tables used to resample the spline at equal steps, per interval between path points
+    arc_samples = 16
+
+    def __init__(self, trackname, points, parameterization='chord', closed=None, smoothing=None):
         """
         Initializes the CubicSplineInterpolator class.
-        
+
         :param trackname: The name of the track.
         :param points: A list of (x, y) tuples representing the path.
+        :param parameterization: Spacing of the spline parameter between the points, one of PARAMETERIZATIONS.
+            'centripetal' and 'chord' follow the distances between the points, so unevenly spaced points do not overshoot.
+        :param closed: Whether the path is a closed loop fitted with periodic boundary conditions, told from the points when None.
+        :param smoothing: Mean squared distance the spline may keep from the points, for noisy paths.
+            None fits an interpolating spline through every point.
         """
+        if parameterization not in PARAMETERIZATIONS:
+            raise ValueError(f"Unknown parameterization '{parameterization}', expected one of {sorted(PARAMETERIZATIONS)}")
         self.track_name = trackname
         self.points = points
+        self.parameterization = parameterization
+        self.closed = closed
+        self.smoothing = smoothing
         self.path = []
+        self.station = np.empty(0)  # Arc length of every smoothed point from the first
+        self.heading = np.empty(0)  # Heading of the path at every smoothed point, in radians
+        self.curvature = np.empty(0)  # Signed curvature at every smoothed point, positive when turning left
 
-    def smooth_path(self, num_points=5000):
+    def fit(self):
         """
-        Smooths a path using cubic spline interpolation.
+        Fits the spline through the points.
 
-        :param num_points: Number of points to interpolate for the smoothed path.
-        :return: A list of (x, y) tuples representing the smoothed path.
+        :return: A function evaluating the spline, or its derivative of the given order, at an array of parameters,
+            and the range of the parameter.
         """
-        # Extract x and y coordinates from points
-        x = [p[0] for p in self.points]
-        y = [p[1] for p in self.points]
-
-        # Create a parameter t based on the length of the path
-        t = np.linspace(0, 1, len(self.points))
+        points = np.asarray(self.points, dtype=float).reshape(-1, 2)
+        # Repeated consecutive points would give the spline parameter zero-length steps
+        points = points[np.concatenate(([True], np.any(np.diff(points, axis=0) != 0, axis=1)))]
+        if len(points) < 4:
+            raise ValueError(f"A spline needs at least 4 distinct points, the path has {len(points)}")
+        if self.closed is None:
+            self.closed = is_closed_loop(points)
+        if self.closed:
+            # The periodic spline returns to the first point
+            points = np.vstack((points, points[:1]))
+        chords = np.hypot(*np.diff(points, axis=0).T)
+        t = np.concatenate(([0.0], np.cumsum(chords ** PARAMETERIZATIONS[self.parameterization])))
+        if self.smoothing is None:
+            spline = CubicSpline(t, points, bc_type='periodic' if self.closed else 'not-a-knot')
+            return lambda u, order=0: spline(u, order), (t[0], t[-1])
+        tck, _ = splprep(points.T, u=t, s=self.smoothing * len(points), per=int(self.closed))
+        return lambda u, order=0: np.column_stack(splev(u, tck, der=order)), (t[0], t[-1])
 
-        # Create cubic spline interpolations
-        cs_x = CubicSpline(t, x)
-        cs_y = CubicSpline(t, y)
+    def smooth_path(self, num_points=5000, spacing=None):
+        """
+        Smooths a path with a cubic spline and resamples it at equal arc-length steps.
 
-        # Generate new t values for the smoothed path
-        t_new = np.linspace(0, 1, num_points)
+        :param num_points: Number of points to interpolate for the smoothed path, when no spacing is given.
+        :param spacing: Arc length between two smoothed points; the nearest step that divides the path evenly is used.
+        :return: A list of (x, y) tuples representing the smoothed path.
+        """
+        evaluate, (t_low, t_high) = self.fit()
+        # Arc length along the spline from a dense table of points, inverted to find the parameters of equal steps
+        t_dense = np.linspace(t_low, t_high, self.arc_samples * len(self.points) + 1)
+        dense = evaluate(t_dense)
+        station_dense = np.concatenate(([0.0], np.cumsum(np.hypot(*np.diff(dense, axis=0).T))))
+        length = station_dense[-1]
+        if spacing is not None:
+            num_points = max(int(round(length / spacing)) + (0 if self.closed else 1), 2)
+        # A closed loop does not repeat its first point at the end
+        self.station = np.linspace(0, length, num_points, endpoint=not self.closed)
+        t_new = np.interp(self.station, station_dense, t_dense)
 
-        # Interpolate x and y values
-        x_smooth = cs_x(t_new)
-        y_smooth = cs_y(t_new)
+        # Position, heading and curvature of the smoothed points from the spline derivatives
+        smooth = evaluate(t_new)
+        first = evaluate(t_new, 1)
+        second = evaluate(t_new, 2)
+        self.heading = np.arctan2(first[:, 1], first[:, 0])
+        speed = np.hypot(first[:, 0], first[:, 1])
+        self.curvature = (first[:, 0] * second[:, 1] - first[:, 1] * second[:, 0]) / speed ** 3
 
         # Combine the smoothed x and y values into a list of tuples
-        self.path = list(zip(x_smooth, y_smooth))
+        self.path = list(map(tuple, smooth.tolist()))
 
         return self.path
-    
-    def export_path(self):
-        # Export path to path.txt
-        current_datetime = datetime.datetime.now()
-        formatted_datetime = current_datetime.strftime("%Y-%m-%d_%H-%M")
-        with open(f'./Data/smoothened_paths/{self.track_name}_{formatted_datetime}_smoothened_path.txt', 'w') as file:
-            for point in self.path:
-                file.write(str(point) + '\n')
+
+    def export_path(self, directory='./Data/smoothened_paths'):
+        # Export the smoothed path with its arc length, heading and curvature to a binary path file in the directory
+        save_path(path_file(directory, f'{self.track_name}_{timestamp()}_smoothened_path'), self.path,
+                  dict(track=self.track_name, smoothing='cubic_spline', source_points=len(self.points), parameterization=self.parameterization,
+                       closed=self.closed, smoothing_factor=self.smoothing),
+                  columns=dict(station=self.station, heading=self.heading, curvature=self.curvature))
         return self.path
+
+def smooth_track_path(track_name, path, spacing=2.0, parameterization='chord', smoothing=None):
+    """
+    Smooths a planned lap and resamples it at a fixed spacing.
+
+    :param track_name: The name of the track.
+    :param path: A list of (x, y) tuples representing the planned lap.
+    :param spacing: Arc length between two smoothed points.
+    :param parameterization: Spacing of the spline parameter between the points, one of PARAMETERIZATIONS.
+    :param smoothing: Mean squared distance the spline may keep from the points, None for an interpolating spline.
+    :return: The CubicSplineInterpolator holding the smoothed path and its heading and curvature.
+    """
+    # Remove repeated values in path while preserving the order
+    path = list(dict.fromkeys(path))
+
+    cubicSplineInterpolator = CubicSplineInterpolator(track_name, path, parameterization=parameterization, smoothing=smoothing)
+    cubicSplineInterpolator.smooth_path(spacing=spacing)
+    return cubicSplineInterpolator
@@ -1,8 +1,13 @@
+import logging
 import os
-import pandas as pd
 import numpy as np
 
-import matplotlib.pyplot as plt
+import Rendering
+from Collision_Checker import CollisionChecker, ObstacleSet
+from Samplers import CorridorSampler
+from Track_Store import CACHE_DIRECTORY, COLLISION_CELL_SIZE, load_track, range_query
+
+logger = logging.getLogger(__name__)
 
 class Initialization:
     # Initialize class variables
@@ -22,97 +27,80 @@ class Initialization:
     track_name = None  # name of the track
     nx = []  # x-component of the track normal vector
     ny = []  # y-component of the track normal vector
-    obstacles = []  # list of all obstacles
+    arc_length = []  # distance along the track centerline from its first point
+    closed = False  # whether the track is a closed circuit
+    track = None  # arrays of the compiled track, see Track_Store
+    obstacles = None  # obstacle boundaries as separate left/right polylines
+    collision_checker = None  # broad-phase collision checker over the obstacle segments
 
-    def __init__(self, track_path):
+    def __init__(self, track_path, plot=False, cache_directory=CACHE_DIRECTORY):
+        # track_path: Path of the track CSV file
+        # plot: Show the track once it is loaded
+        # cache_directory: Directory of the compiled track files
         self.track_path = track_path
-        self.read_track_data()  # Read track data from file
-        self.calculate_boundary_points()  # Calculate track boundary points
-        self.calculate_obstacle_points()  # Calculate obstacle boundary points
+        self.read_track_data(cache_directory)  # Read the compiled track, compiling it on first use
         self.load_total_obstacles()  # Load all obstacles
-        self.plot_track()  # Plot the track
+        if plot:
+            self.plot_track()  # Plot the track
         
+    # Bounds of both track boundaries between the start and goal centerline indices, grown by 5,
+    # answered in constant time from the range tables of the compiled track
     def x_min(self, start, goal):
-        x_left_cut = self.x_left[start:goal]
-        x_right_cut = self.x_right[start:goal]
-        x_left_min =  min(x_left_cut)
-        x_right_min = min(x_right_cut)
-        return min(x_left_min, x_right_min)-5
+        return range_query(self.track['x_low_table'], start, goal, min)-5
     
     def x_max(self, start, goal):
-        x_left_cut = self.x_left[start:goal]
-        x_right_cut = self.x_right[start:goal]
-        x_left_max =  max(x_left_cut)
-        x_right_max = max(x_right_cut)
-        return max(x_left_max, x_right_max)+5
+        return range_query(self.track['x_high_table'], start, goal, max)+5
     
     def y_min(self, start, goal):
-        y_left_cut = self.y_left[start:goal]
-        y_right_cut = self.y_right[start:goal]
-        y_left_min =  min(y_left_cut)
-        y_right_min = min(y_right_cut)
-        return min(y_left_min, y_right_min)-5
+        return range_query(self.track['y_low_table'], start, goal, min)-5
     
     def y_max(self, start, goal):
-        y_left_cut = self.y_left[start:goal]
-        y_right_cut = self.y_right[start:goal]
-        y_left_max =  max(y_left_cut)
-        y_right_max = max(y_right_cut)
-        return max(y_left_max, y_right_max)+5
+        return range_query(self.track['y_high_table'], start, goal, max)+5
         
-    def read_track_data(self):
-        # Read track data from CSV file
-        data = pd.read_csv(self.track_path, delimiter=',', encoding='utf-8')
+    def obstacle_window(self, x_low, x_high, y_low, y_high, margin=10):
+        # Return only the obstacle segments that overlap the given sampling box grown by margin
+        return self.obstacles.window(x_low - margin, x_high + margin, y_low - margin, y_high + margin)
+
+    def corridor_sampler(self, start, goal, margin=1.5):
+        # Sampler drawing random points on the track between the start and goal centerline indices,
+        # margin metres inside the track boundaries (half a metre inside the obstacle boundaries).
+        # The corridor follows the compiled centerline, as the drivers move points of x and y onto the goals they reach.
+        return CorridorSampler(self.track['x'], self.track['y'], self.nx, self.ny, self.w_tr_left, self.w_tr_right, start, goal, margin)
+
+    def read_track_data(self, cache_directory=CACHE_DIRECTORY):
+        # Read the centerline, track widths, normals, boundaries and obstacle boundaries of the compiled track.
+        # The drivers move centerline points onto the goals they reach, so x and y are copies; the other arrays
+        # stay mapped read-only.
+        self.track = load_track(self.track_path, cache_directory)
         self.track_name = os.path.basename(self.track_path).split('.')[0]
-        print(self.track_name+"asdasd")
-        self.x = data['# x_m']  # Get x-coordinate of track centerline
-        self.y = data['y_m']  # Get y-coordinate of track centerline
-        self.w_tr_right = data['w_tr_right_m']  # Get width of track on the right side
-        self.w_tr_left = data['w_tr_left_m']  # Get width of track on the left side
+        logger.debug("Read %d centerline points of %s", len(self.track['x']), self.track_name)
+        self.x = np.array(self.track['x'])
+        self.y = np.array(self.track['y'])
+        for name in ('w_tr_right', 'w_tr_left', 'nx', 'ny', 'x_right', 'y_right', 'x_left', 'y_left',
+                     'x_right_obs', 'y_right_obs', 'x_left_obs', 'y_left_obs', 'arc_length'):
+            setattr(self, name, self.track[name])
+        self.closed = bool(self.track['closed'])
         
-    def calculate_boundary_points(self):
-        # Calculate track boundary points using gradient and normal vectors
-        dx = np.gradient(self.x)
-        dy = np.gradient(self.y)
-        norm = np.sqrt(dx**2 + dy**2)
-        self.nx = dy / norm  # Calculate x-component of the track normal vector
-        self.ny = -dx / norm  # Calculate y-component of the track normal vector
+    def is_closed_circuit(self):
+        # The track is a closed circuit when its last centerline point lies about one point spacing from the first
+        return self.closed
 
-        self.x_right = self.x + self.w_tr_right * self.nx  # Calculate x-coordinate of track right boundary
-        self.y_right = self.y + self.w_tr_right * self.ny  # Calculate y-coordinate of track right boundary
-        self.x_left = self.x - self.w_tr_left * self.nx  # Calculate x-coordinate of track left boundary
-        self.y_left = self.y - self.w_tr_left * self.ny  # Calculate y-coordinate of track left boundary
-        
-    def calculate_obstacle_points(self):
-        # Calculate obstacle boundary points by adding a fixed offset to track boundary points
-        self.x_right_obs = self.x + (self.w_tr_right - 1) * self.nx
-        self.y_right_obs = self.y + (self.w_tr_right - 1) * self.ny
-        self.x_left_obs = self.x - (self.w_tr_left - 1) * self.nx
-        self.y_left_obs = self.y - (self.w_tr_left - 1) * self.ny
-        
     def load_total_obstacles(self):
-        self.obstacles = list(zip(self.x_left_obs, self.y_left_obs))
-        obstacles_temporary = list(zip(self.x_right_obs, self.y_right_obs))
-        self.obstacles.extend(obstacles_temporary)
+        # Keep the left and right obstacle boundaries as separate polylines so that no segment joins one to the other.
+        # The collision grid over them comes from the compiled track.
+        self.obstacles = ObstacleSet([
+            (np.column_stack((self.x_left_obs, self.y_left_obs)), self.closed),
+            (np.column_stack((self.x_right_obs, self.y_right_obs)), self.closed),
+        ])
+        grid = tuple(self.track[name] for name in ('grid_origin', 'grid_shape', 'grid_cell_segments', 'grid_cell_offsets'))
+        self.collision_checker = CollisionChecker.from_obstacles(self.obstacles, cell_size=COLLISION_CELL_SIZE, grid=grid)
         
-    def plot_track(self):
-        # Plot the track and its boundaries
-        plt.figure(figsize=(30, 20))
-        plt.plot(self.x, self.y, label='Track Centerline', color='blue')
-        plt.plot(self.x_right, self.y_right, linestyle='--', label='Track Right Boundary', color='green')
-        plt.plot(self.x_left, self.y_left, linestyle='--', label='Track Left Boundary', color='red')
-        plt.plot(self.x_right_obs, self.y_right_obs, linestyle='--', label='Obstacle Right Boundary', color='orange')
-        plt.plot(self.x_left_obs, self.y_left_obs, linestyle='--', label='Obstacle Left Boundary', color='purple')
-        plt.fill_between(self.x_right, self.y_right, self.y_left, color='gray', alpha=0.2)
-        plt.xlabel('X (m)')
-        plt.ylabel('Y (m)')
-        plt.title('Race Track')
-        plt.legend()
-        plt.grid(True)
-        plt.gca().set_aspect('equal', adjustable='box')
-        plt.show()
+    def plot_track(self, output=None):
+        # Plot the track and its boundaries, shown interactively or written to the output file
+        Rendering.plot_track(self, output)
         
     def export_track_boundaries(self):
         # Export track boundaries to a CSV file
-        new_data = pd.DataFrame({'x_right': self.x_right, 'y_right': self.y_right, 'x_left': self.x_left, 'y_left': self.y_left})
-        new_data.to_csv(f'./Data/track_boundaries/{self.track_name}_track_boundaries.csv', index=False)
\ No newline at end of file
+        os.makedirs('./Data/track_boundaries', exist_ok=True)
+        np.savetxt(f'./Data/track_boundaries/{self.track_name}_track_boundaries.csv', np.column_stack((self.x_right, self.y_right, self.x_left, self.y_left)),
+                   fmt='%.17g', delimiter=',', header='x_right,y_right,x_left,y_left', comments='')
\ No newline at end of file
@@ -0,0 +1,183 @@
+import argparse
+import csv
+import glob
+import os
+import sys
+
+import numpy as np
+
+from Comparision import PATH_DIRECTORY, RACELINE_DIRECTORY, load_raceline, track_of
+from Cubic_Spline_Interpolation import CubicSplineInterpolator, is_closed_loop
+from Path_IO import load_path, path_file, save_path
+
+# Lap time of a line around a track from a point-mass velocity profile. The speed at every point is capped by the
+# lateral grip in the curvature there and by the top speed, then limited by how fast the car can accelerate out of
+# and brake into the slower points around it. With constant acceleration limits both passes are running minima in
+# v^2 over arc length, so they are computed with np.minimum.accumulate instead of a loop over the points.
+
+
+class Vehicle:
+    # Limits of the point-mass car the velocity profile is computed for, in metres and seconds
+
+    def __init__(self, lateral_acceleration=15.0, acceleration=8.0, braking=15.0, top_speed=85.0):
+        # lateral_acceleration: Largest acceleration towards the centre of a turn
+        # acceleration: Largest forward acceleration
+        # braking: Largest deceleration
+        # top_speed: Largest speed
+        if min(lateral_acceleration, acceleration, braking, top_speed) <= 0:
+            raise ValueError("Vehicle limits must be positive")
+        self.lateral_acceleration = lateral_acceleration
+        self.acceleration = acceleration
+        self.braking = braking
+        self.top_speed = top_speed
+
+
+class LapResult:
+    # Velocity profile of a line: speed at every point and the time to drive the line
+
+    def __init__(self, station, curvature, speed, length, closed, points=None):
+        # station: Arc length of every point from the first
+        # curvature: Signed curvature at every point
+        # speed: Speed at every point
+        # length: Length of the line, including the step back to the first point of a closed line
+        # closed: Whether the line is a lap ending where it started
+        # points: (N, 2) array of the points, when known
+        self.points = points
+        self.station = station
+        self.curvature = curvature
+        self.speed = speed
+        self.length = length
+        self.closed = closed
+        self.segment_times = segment_times(station, speed, length, closed)
+        self.lap_time = float(self.segment_times.sum())
+
+    def summary(self):
+        # Lap time, length and speed statistics
+        return dict(lap_time=self.lap_time, length=float(self.length), mean_speed=float(self.length / self.lap_time),
+                    min_speed=float(self.speed.min()), max_speed=float(self.speed.max()))
+
+def speed_profile(station, curvature, length, closed=True, vehicle=None):
+    # Speed at every point of a line with the given arc lengths and curvatures.
+    # A closed line is tiled three times so that the middle lap sees the lap before and after it; an open line
+    # starts and ends at the speeds its curvature allows.
+    vehicle = vehicle if vehicle is not None else Vehicle()
+    station = np.asarray(station, dtype=float)
+    # Squared speed allowed by the lateral grip and the top speed
+    cap = np.minimum(vehicle.lateral_acceleration / np.maximum(np.abs(curvature), 1e-12), vehicle.top_speed**2)
+    if closed:
+        count = len(station)
+        station = np.concatenate((station - length, station, station + length))
+        cap = np.tile(cap, 3)
+    # Accelerating from point j: v_i^2 <= cap_j + 2 a (s_i - s_j) for every j <= i
+    forward = np.minimum.accumulate(cap - 2 * vehicle.acceleration * station) + 2 * vehicle.acceleration * station
+    # Braking into point j: v_i^2 <= cap_j + 2 b (s_j - s_i) for every j >= i
+    backward = np.minimum.accumulate((cap + 2 * vehicle.braking * station)[::-1])[::-1] - 2 * vehicle.braking * station
+    speed = np.sqrt(np.minimum(forward, backward))
+    return speed[count:2 * count] if closed else speed
+
+def segment_times(station, speed, length, closed=True):
+    # Time to drive from every point to the next, the speed changing at a constant rate in between
+    steps = np.diff(station)
+    next_speed = speed[1:]
+    if closed:
+        steps = np.append(steps, length - station[-1])
+        next_speed = np.append(next_speed, speed[0])
+    return 2 * steps / np.maximum(speed[:len(steps)] + next_speed, 1e-12)
+
+def evaluate(station, curvature, length, closed=True, vehicle=None, points=None):
+    # Velocity profile and lap time of a line given by the arc lengths and curvatures of its points
+    station = np.asarray(station, dtype=float)
+    curvature = np.asarray(curvature, dtype=float)
+    return LapResult(station, curvature, speed_profile(station, curvature, length, closed, vehicle), length, closed, points)
+
+def evaluate_interpolator(interpolator, vehicle=None):
+    # Velocity profile of the smoothed path of a CubicSplineInterpolator, from the curvature it computed
+    station = interpolator.station
+    step = station[1] - station[0]
+    length = station[-1] + step if interpolator.closed else station[-1]
+    return evaluate(station, interpolator.curvature, length, interpolator.closed, vehicle, np.array(interpolator.path))
+
+def evaluate_points(points, spacing=2.0, closed=None, vehicle=None):
+    # Velocity profile of a line given only by its points, fitted with a cubic spline to find its curvature
+    interpolator = CubicSplineInterpolator(None, points, closed=closed)
+    interpolator.smooth_path(spacing=spacing)
+    return evaluate_interpolator(interpolator, vehicle)
+
+def evaluate_saved(saved, spacing=2.0, vehicle=None):
+    # Velocity profile of a path read by load_path. Smoothed paths that store their arc length and curvature are
+    # used as they are, other paths are fitted with a cubic spline first.
+    if 'station' in saved.columns and 'curvature' in saved.columns:
+        station = np.asarray(saved.columns['station'])
+        closed = saved.metadata.get('closed')
+        closed = is_closed_loop(np.asarray(saved.points)) if closed is None else closed
+        length = station[-1] + (station[1] - station[0]) if closed else station[-1]
+        return evaluate(station, saved.columns['curvature'], length, closed, vehicle, np.asarray(saved.points))
+    return evaluate_points(saved.points, spacing, vehicle=vehicle)
+
+def evaluate_file(file_path, spacing=2.0, vehicle=None):
+    # Velocity profile of a binary or text path file
+    return evaluate_saved(load_path(file_path), spacing, vehicle)
+
+def evaluate_raceline(track_name, raceline_directory=RACELINE_DIRECTORY, spacing=2.0, vehicle=None):
+    # Velocity profile of the reference raceline of a track
+    return evaluate_points(load_raceline(track_name, raceline_directory), spacing, vehicle=vehicle)
+
+def evaluate_files(file_paths, raceline_directory=RACELINE_DIRECTORY, spacing=2.0, vehicle=None, trace_directory=None):
+    # Lap time of every path file next to the lap time of the reference raceline of its track.
+    # trace_directory: Also write the speed trace of every file there as a path file with station, curvature and speed columns
+    # Returns one row per file.
+    references = {}
+    rows = []
+    for file_path in file_paths:
+        saved = load_path(file_path)
+        result = evaluate_saved(saved, spacing, vehicle)
+        track_name = track_of(file_path, saved)
+        if track_name not in references:
+            raceline_path = os.path.join(raceline_directory, f'{track_name}.csv')
+            references[track_name] = evaluate_raceline(track_name, raceline_directory, spacing, vehicle).lap_time if os.path.exists(raceline_path) else None
+        row = dict(file=file_path, track=track_name, **result.summary())
+        row['raceline_lap_time'] = references[track_name]
+        row['delta'] = None if references[track_name] is None else result.lap_time - references[track_name]
+        rows.append(row)
+        if trace_directory is not None:
+            write_trace(trace_directory, file_path, result)
+    return rows
+
+def write_trace(directory, file_path, result):
+    # Write the speed trace of a path file as a path file of the evaluated points
+    name = os.path.splitext(os.path.basename(file_path))[0] + '_speed'
+    save_path(path_file(directory, name), result.points, dict(source=file_path, lap_time=result.lap_time, closed=result.closed),
+              columns=dict(station=result.station, curvature=result.curvature, speed=result.speed))
+
+def print_table(rows):
+    # Print the lap time of every file and of its reference raceline, one line per file
+    names = [os.path.basename(row['file']) for row in rows]
+    name_width = max(len(name) for name in names + ['file']) + 2
+    print(f"{'file':<{name_width}}{'track':<14}{'lap time':>10}{'raceline':>10}{'delta':>9}{'length':>9}{'min v':>8}{'max v':>8}")
+    for name, row in zip(names, rows):
+        reference = f"{row['raceline_lap_time']:>10.2f}{row['delta']:>+9.2f}" if row['raceline_lap_time'] is not None else f"{'-':>10}{'-':>9}"
+        print(f"{name:<{name_width}}{row['track']:<14}{row['lap_time']:>10.2f}{reference}{row['length']:>9.1f}{row['min_speed']:>8.1f}{row['max_speed']:>8.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Estimate the lap times of generated paths and of the reference racelines of their tracks')
+    parser.add_argument('paths', nargs='*', help=f'Binary or text path files, every file in {PATH_DIRECTORY} when omitted')
+    parser.add_argument('--raceline-dir', default=RACELINE_DIRECTORY, help='Directory of the reference raceline CSV files')
+    parser.add_argument('--spacing', type=float, default=2.0, help='Arc-length step of the spline fitted to paths without stored curvature')
+    parser.add_argument('--lateral-acceleration', type=float, default=15.0, help='Largest lateral acceleration, m/s^2')
+    parser.add_argument('--acceleration', type=float, default=8.0, help='Largest forward acceleration, m/s^2')
+    parser.add_argument('--braking', type=float, default=15.0, help='Largest deceleration, m/s^2')
+    parser.add_argument('--top-speed', type=float, default=85.0, help='Largest speed, m/s')
+    parser.add_argument('--csv', default=None, help='Also write the lap times to this CSV file')
+    parser.add_argument('--trace-dir', default=None, help='Write the speed trace of every path to this directory')
+    arguments = parser.parse_args()
+    file_paths = arguments.paths or sorted(glob.glob(os.path.join(PATH_DIRECTORY, '*.txt')) + glob.glob(os.path.join(PATH_DIRECTORY, '*.npz')))
+    if not file_paths:
+        sys.exit(f"No path files found in {PATH_DIRECTORY}")
+    vehicle = Vehicle(arguments.lateral_acceleration, arguments.acceleration, arguments.braking, arguments.top_speed)
+    rows = evaluate_files(file_paths, arguments.raceline_dir, arguments.spacing, vehicle, arguments.trace_dir)
+    print_table(rows)
+    if arguments.csv is not None:
+        with open(arguments.csv, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
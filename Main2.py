@@ -1,22 +1,58 @@
-import datetime
-import os
-import sys
+import argparse
+import logging
+import time
 
-import matplotlib.pyplot as plt
 import numpy as np
 from Initialization import Initialization
+from Metrics import PROFILERS, profiled, segment_summary, write_json_line
+from Path_IO import path_file, save_path, timestamp
+from Rendering import plot_output, plot_path
 from RRT_Star_M import RRTStar_M
-from Cubic_Spline_Interpolation import CubicSplineInterpolator
+from RRT_Star_Connect import RRTStarConnect
+from RRT_Star_Lap import RRTStarLap
+from Cubic_Spline_Interpolation import smooth_track_path
+from Segment_Planning import plan_segment, plan_segments_parallel, segment_seed, split_track
 
-def Main(track_path):
-    init = Initialization(track_path)
-    
+SAMPLERS = ('cone', 'corridor')
+ENGINES = {'rrt_star_m': RRTStar_M, 'rrt_star_connect': RRTStarConnect, 'rrt_star_lap': RRTStarLap}  # Planners by name
+SEGMENT_MAX_ITER = 75  # Iterations a planner runs for per attempt at one segment, 1/200 of the lap, unless max_iter is given
+
+logger = logging.getLogger(__name__)
+
+def plan_lap(init, workers=1, seed=None, sampler='cone', time_limit=None, max_stall_iter=None, max_attempts=50,
+             engine='rrt_star_m', turning_radius=None, planners=None, summary_file=None, max_iter=None, export_segments=True):
+    # Plan the whole lap segment by segment and return the joined path
+    # init: Initialization of the track
+    # workers: Number of processes planning segments concurrently, 1 plans them one after another
+    # seed: Run seed from which every segment seed is derived, None for a random run
+    # sampler: 'cone' to draw random points in the cone ahead of the start, 'corridor' to draw them on the track between the segment ends
+    # time_limit: Seconds each segment may be planned for per attempt, no limit when None
+    # max_stall_iter: Stop planning a segment once its path has not improved for this many iterations, no limit when None
+    # max_attempts: Planning attempts per segment before giving up with a RuntimeError
+    # engine: Name of the planner in ENGINES; only RRTStar_M takes the point before the start and samples the cone,
+    #         and 'rrt_star_lap' plans the whole lap with one tree instead of segments, always sampling the corridor of the lap
+    # turning_radius: Smallest radius RRTStar_M may turn with, steering along arcs from the heading of each node; straight steering when None
+    # planners: List every planner run is appended to, failed attempts included, e.g. to read their counters;
+    #           with workers > 1 only the planners whose paths were joined are known here
+    # summary_file: JSON-lines file a summary of every planner run, with its phase times, is appended to; no summaries when None
+    # max_iter: Iterations each planner runs for per attempt; SEGMENT_MAX_ITER for a segment, or the lap budget of
+    #           RRTStarLap.track_job, when None
+    # export_segments: Export the path of the 'rrt_star_lap' planner, which plans the lap as one segment, as Main does
+    planner_class = ENGINES[engine]
+    if turning_radius is not None and planner_class is not RRTStar_M:
+        raise ValueError(f"Only the rrt_star_m engine steers with a turning radius, not {engine}")
+    # The summaries are written from the planners list, so keep one even when the caller does not
+    if summary_file is not None and planners is None:
+        planners = []
     finished = False
+    last_segment = False
     serial = 1
     start = 1
     goal = 0
     length_of_track = len(init.x)
     path = []
+    attempt = 0
+    previous = None
     
     # while serial * (length_of_track//10) <  750:
     #     serial += 1
@@ -25,21 +61,84 @@ def Main(track_path):
     # init.x[start] = init.x[start] -12
     # init.y[start] = init.y[start] -12
     
-    p_start = (init.x[start-1], init.y[start-1])
-    
+    def make_job(start, goal, start_point, serial, previous):
+        # Constructor arguments of the planner instance planning one segment. The point before the start is
+        # the point before the previous segment's goal when that segment is known, else the previous centerline point.
+        # With a turning radius it is taken behind the goal along the heading the previous path arrives with.
+        if previous is None:
+            p_start = (init.x[start-1], init.y[start-1])
+        elif planner_class is RRTStar_M and turning_radius is not None:
+            heading = previous.heading[previous.goal_id]
+            p_start = (previous.goal_discovered[0] - np.cos(heading), previous.goal_discovered[1] - np.sin(heading))
+        else:
+            p_start = previous.path[-2]
+        x_low, x_high, y_low, y_high = init.x_min(start, goal), init.x_max(start, goal), init.y_min(start, goal), init.y_max(start, goal)
+        kwargs = dict(x_low=x_low, x_high=x_high, y_low=y_low, y_high=y_high, time_limit=time_limit, max_stall_iter=max_stall_iter,
+                      max_iter=SEGMENT_MAX_ITER if max_iter is None else max_iter, timed=summary_file is not None)
+        if sampler == 'corridor':
+            kwargs['sampler'] = init.corridor_sampler(start, goal)
+            # The tree stays between the start point and the corridor
+            bounds = kwargs['sampler'].bounds()
+            bounds = (min(bounds[0], start_point[0]), max(bounds[1], start_point[0]), min(bounds[2], start_point[1]), max(bounds[3], start_point[1]))
+        elif planner_class is RRTStar_M:
+            # RRTStar_M samples around the start rather than inside the box, so window the obstacles to its reach
+            bounds = RRTStar_M.sampling_bounds(start_point, (init.x[goal], init.y[goal]))
+        else:
+            bounds = (x_low, x_high, y_low, y_high)
+        obstacles = init.obstacle_window(*bounds)
+        args = (init.track_name, init.x_left, init.y_left, init.x_right, init.y_right, start_point, (init.x[goal], init.y[goal]), obstacles)
+        if planner_class is RRTStar_M:
+            args = args[:1] + (p_start,) + args[1:]
+            kwargs['turning_radius'] = turning_radius
+            # Direction of the centerline through the goal
+            after, before = (goal + 1) % length_of_track, goal - 1
+            kwargs['goal_heading'] = np.arctan2(init.y[after] - init.y[before], init.x[after] - init.x[before])
+        return args, kwargs
+
+    def write_summaries(first):
+        # Append the summaries of the planner runs from index first on to the summary file
+        if summary_file is not None:
+            for planner in planners[first:]:
+                write_json_line(summary_file, segment_summary(planner))
+
+    if planner_class is RRTStarLap:
+        args, kwargs = RRTStarLap.track_job(init)
+        if max_iter is not None:
+            kwargs['max_iter'] = max_iter
+        rrt_star = plan_segment(RRTStarLap, args, dict(kwargs, time_limit=time_limit, max_stall_iter=max_stall_iter, timed=summary_file is not None),
+                                serial, seed, max_attempts, planners)
+        write_summaries(0)
+        if not rrt_star.reached:
+            raise RuntimeError(f"The lap was not closed in {max_attempts} attempts")
+        if export_segments:
+            rrt_star.export_path()
+        return rrt_star.path
+
+    if workers > 1:
+        segments = split_track(length_of_track, 200, first_start=start)
+        start_points = [(init.x[start], init.y[start]) for start, goal in segments]
+        path, segment_planners = plan_segments_parallel(planner_class, make_job, segments, start_points, workers, seed=seed, max_attempts=max_attempts)
+        if planners is not None:
+            planners.extend(segment_planners)
+        write_summaries(0)
+        finished = True
+
     while finished == False:
-        if (serial * (length_of_track//200)) < length_of_track:
+        if (serial * (length_of_track//200)) < length_of_track - 1:
             goal = serial * (length_of_track//200)
-            print(goal)
         else:
             goal = length_of_track - 1
-            finished = True
+            last_segment = True
         
-        print(init.x[start], init.y[start], init.x[goal], init.y[goal])
-        print(init.x_min(start, goal), init.x_max(start, goal), init.y_min(start, goal), init.y_max(start, goal))
-        rrt_star = RRTStar_M(init.track_name, p_start, init.x_left, init.y_left, init.x_right, init.y_right, (init.x[start], init.y[start]), (init.x[goal], init.y[goal]), init.obstacles, x_low=init.x_min(start, goal), x_high=init.x_max(start, goal), y_low=init.y_min(start, goal), y_high=init.y_max(start, goal), serial=serial)
+        logger.info("Segment %d: centerline %d to %d, (%.1f, %.1f) to (%.1f, %.1f)", serial, start, goal, init.x[start], init.y[start], init.x[goal], init.y[goal])
+        args, kwargs = make_job(start, goal, (init.x[start], init.y[start]), serial, previous)
+        logger.debug("Sampling box x %.1f to %.1f, y %.1f to %.1f", kwargs['x_low'], kwargs['x_high'], kwargs['y_low'], kwargs['y_high'])
+        rrt_star = planner_class(*args, serial=serial, seed=segment_seed(seed, serial, attempt), **kwargs)
         rrt_star.build_rrt_star()
         rrt_star.plot_rrt_star()
+        if planners is not None:
+            planners.append(rrt_star)
+            write_summaries(-1)
         #rrt_star.export_path()
         if rrt_star.reached:
             path += rrt_star.path
@@ -53,64 +152,93 @@ def Main(track_path):
             #init.obstacles.append((init.x_left[start-7], init.y_left[start-7]))
             #init.obstacles.append((init.x_right[start-7], init.y_right[start-7]))
             serial += 1
-            p_start = rrt_star.tree[rrt_star.goal_discovered]
+            attempt = 0
+            finished = last_segment
+            previous = rrt_star
             #angle1 = np.arctan2(init.y[start] - p_start[1], init.x[start] - p_start[0])
             #angle2 = np.arctan2(init.y[start+2] - init.y[start+1], init.x[start+2] - init.x[start+1])
             #print(f"angle {angle1}, {angle2}")
+        else:
+            attempt += 1
+            if attempt == max_attempts:
+                raise RuntimeError(f"Segment {serial} did not reach its goal in {max_attempts} attempts")
+    return path
+
+def Main(track_path, workers=1, seed=None, show_plots=False, plot_directory=None, plot_format='png', sampler='cone',
+         time_limit=None, max_stall_iter=None, max_attempts=50, engine='rrt_star_m', turning_radius=None, summary_file=None,
+         profile_file=None, profiler='cprofile', smoothing=None, max_iter=None):
+    # track_path: Path of the track CSV file
+    # workers: Number of processes planning segments concurrently, 1 plans them one after another
+    # seed: Run seed from which every segment seed is derived, None for a random run
+    # show_plots: Show the track and the found paths in interactive windows
+    # plot_directory: Write the plots as files to this directory instead of showing them
+    # plot_format: File format of the written plots, e.g. 'png' or 'svg'
+    # sampler: Region random points are drawn from, one of SAMPLERS
+    # time_limit: Seconds each segment may be planned for per attempt, no limit when None
+    # max_stall_iter: Stop planning a segment once its path has not improved for this many iterations, no limit when None
+    # max_attempts: Planning attempts per segment before giving up with a RuntimeError
+    # engine: Name of the segment planner in ENGINES
+    # turning_radius: Smallest radius RRTStar_M may turn with, straight steering when None
+    # summary_file: JSON-lines file a summary of every planner run is appended to, no summaries when None
+    # profile_file: Profile the planning and write the profile to this file, no profiling when None
+    # profiler: 'cprofile' for a pstats file, 'sampling' for sampled stacks in collapsed flame graph format
+    # smoothing: Mean squared distance the smoothed lap may keep from the planned one, None for an interpolating spline
+    # max_iter: Iterations each planner runs for per attempt, the default budget of the engine when None
+    plot = show_plots or plot_directory is not None
+    init = Initialization(track_path)
+    if plot:
+        init.plot_track(plot_output(plot_directory, f'{init.track_name}_track', plot_format))
+    started = time.perf_counter()
+    with profiled(profile_file, profiler):
+        path = plan_lap(init, workers=workers, seed=seed, sampler=sampler, time_limit=time_limit, max_stall_iter=max_stall_iter, max_attempts=max_attempts,
+                        engine=engine, turning_radius=turning_radius, summary_file=summary_file, max_iter=max_iter)
+    planning_time = time.perf_counter() - started
     
-    
-    current_datetime = datetime.datetime.now()
-    formatted_datetime = current_datetime.strftime("%Y-%m-%d_%H-%M")
-    with open(f'./Data/paths_found/{init.track_name}_ALL_{formatted_datetime}_path.txt', 'w') as file:
-        for point in path:
-            file.write(str(point) + '\n')
-            
-    # Plot the RRT* tree and the path from start to goal
-    plt.figure(figsize=(10, 8))
-    plt.plot(init.x_left, init.y_left, label='Track Left Boundary', linestyle='--', color='red')
-    plt.plot(init.x_right, init.y_right, label='Track Right Boundary', linestyle='--', color='green')
-    plt.xlabel('X')
-    plt.ylabel('Y')
-    plt.title('RRT* Path Planning')
-    plt.grid(True)
-    # Plot the path from start to goal
-    
-    x_path, y_path = zip(*(path))
-    
-    plt.plot(x_path, y_path, 'g-', label='Unsmoothened full path', linewidth=2)
-    plt.legend()
-    plt.show()
-       
-        
-        
-    # Remove repeated values in path while preserving the order
-    path = list(dict.fromkeys(path))
-        
-    cubicSplineInterpolator = CubicSplineInterpolator(init.track_name, path)
-    file_name = os.path.basename(track_path).split('.')[0]
-    line_count = 0
-    with open(f'./Data/racetrack-database/racelines/{file_name}.csv', 'r') as file:
-        for line in file:
-            line_count += 1
+    save_path(path_file('./Data/paths_found', f'{init.track_name}_ALL_{timestamp()}_path'), path,
+              dict(track=init.track_name, driver='Main2', seed=seed, planning_time=planning_time,
+                   parameters=dict(engine=engine, sampler=sampler, workers=workers, time_limit=time_limit, max_stall_iter=max_stall_iter,
+                                   max_attempts=max_attempts, turning_radius=turning_radius, max_iter=max_iter)))
+
+    if plot:
+        plot_path(init, path, 'Unsmoothened full path', plot_output(plot_directory, f'{init.track_name}_path', plot_format))
 
-    print(f"The file {file_name} has {line_count} lines.")
-    smoothed_path = cubicSplineInterpolator.smooth_path(num_points=line_count-1)
+    cubicSplineInterpolator = smooth_track_path(init.track_name, path, smoothing=smoothing)
+    smoothed_path = cubicSplineInterpolator.path
     cubicSplineInterpolator.export_path()
-    
-                         
-    # Plot the RRT* tree and the path from start to goal
-    plt.figure(figsize=(10, 8))
-    plt.plot(init.x_left, init.y_left, label='Track Left Boundary', linestyle='--', color='red')
-    plt.plot(init.x_right, init.y_right, label='Track Right Boundary', linestyle='--', color='green')
-    plt.xlabel('X')
-    plt.ylabel('Y')
-    plt.title('RRT* Path Planning')
-    plt.grid(True)
-    # Plot the path from start to goal
-    x_path, y_path = zip(*(smoothed_path))
-    plt.plot(x_path, y_path, 'g-', label='Smoothened full path', linewidth=2)
-    plt.legend()
-    plt.show()
+
+    if plot:
+        plot_path(init, smoothed_path, 'Smoothened full path', plot_output(plot_directory, f'{init.track_name}_smoothened_path', plot_format))
     
 if __name__ == "__main__":
-    Main(sys.argv[1])
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Plan a raceline around a track with the heading-constrained RRT*')
+    parser.add_argument('track_path', help='Path of the track CSV file')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes planning segments concurrently')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for a reproducible run')
+    parser.add_argument('--plot', action='store_true', help='Show the track and the found paths')
+    parser.add_argument('--plot-dir', default=None, help='Write the plots to this directory instead of showing them')
+    parser.add_argument('--plot-format', default='png', help='File format of the written plots, e.g. png or svg')
+    parser.add_argument('--sampler', choices=SAMPLERS, default=None, help='Region random points are drawn from, cone by default')
+    parser.add_argument('--time-limit', type=float, default=None, help='Seconds each segment may be planned for per attempt')
+    parser.add_argument('--max-stall-iter', type=int, default=None, help='Stop planning a segment once its path has not improved for this many iterations')
+    parser.add_argument('--max-attempts', type=int, default=50, help='Planning attempts per segment before giving up')
+    parser.add_argument('--max-iter', type=int, default=None, help=f'Iterations per planning attempt, {SEGMENT_MAX_ITER} per segment by default')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='rrt_star_m', help='Planner to use')
+    parser.add_argument('--turning-radius', type=float, default=None, help='Smallest radius the heading-constrained planner may turn with')
+    parser.add_argument('--summary', default=None, help='Append a JSON line with the counters and phase times of every planner run to this file')
+    parser.add_argument('--profile', default=None, help='Profile the planning and write the profile to this file')
+    parser.add_argument('--profiler', choices=PROFILERS, default='cprofile', help='cprofile for a pstats file, sampling for collapsed stacks')
+    parser.add_argument('--smoothing', type=float, default=None, help='Let the smoothed lap keep this mean squared distance from the planned one, for noisy paths')
+    parser.add_argument('--log-level', default='INFO', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'), help='Least severe log messages shown')
+    arguments = parser.parse_args()
+    if arguments.turning_radius is not None and arguments.engine != 'rrt_star_m':
+        parser.error(f"--turning-radius needs --engine rrt_star_m, {arguments.engine} steers straight")
+    if arguments.engine == 'rrt_star_lap' and arguments.sampler == 'cone':
+        parser.error("--engine rrt_star_lap always samples the corridor of the whole lap, not the cone")
+    if arguments.engine == 'rrt_star_lap' and arguments.workers > 1:
+        parser.error("--engine rrt_star_lap plans the lap with one tree, so it cannot use more than one worker")
+    logging.basicConfig(level=arguments.log_level, format='%(levelname)s %(name)s: %(message)s')
+    Main(arguments.track_path, workers=arguments.workers, seed=arguments.seed, show_plots=arguments.plot,
+         plot_directory=arguments.plot_dir, plot_format=arguments.plot_format, sampler=arguments.sampler or ('corridor' if arguments.engine == 'rrt_star_lap' else 'cone'),
+         time_limit=arguments.time_limit, max_stall_iter=arguments.max_stall_iter, max_attempts=arguments.max_attempts,
+         engine=arguments.engine, turning_radius=arguments.turning_radius, summary_file=arguments.summary, profile_file=arguments.profile,
+         profiler=arguments.profiler, smoothing=arguments.smoothing, max_iter=arguments.max_iter)
\ No newline at end of file
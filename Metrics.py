@@ -0,0 +1,172 @@
+import cProfile
+import collections
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+# Telemetry for the planners and drivers: phase timers kept by every planner, the counters and per-segment
+# summary of a planner run, JSON-lines output and profiling hooks.
+
+class PhaseTimer:
+    # Context manager adding the time spent inside it to one phase of a PhaseTimers
+
+    def __init__(self, totals, name):
+        self.totals = totals
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        total = self.totals[self.name]
+        total[0] += time.perf_counter() - self.started
+        total[1] += 1
+        return False
+
+
+class PhaseTimers:
+    # Time spent in and calls of named phases of a planner run. Phases may nest, each one counts the time
+    # of the phases inside it too. When disabled, phase() hands out a shared context manager that does nothing.
+
+    def __init__(self, enabled=True):
+        # enabled: Time the phases, else only pay for entering and leaving a no-op context manager
+        self.enabled = enabled
+        self.totals = {}  # Seconds and calls by phase name
+        self.timers = {}
+
+    def phase(self, name):
+        # Context manager timing one pass through the named phase
+        if not self.enabled:
+            return NO_PHASE
+        timer = self.timers.get(name)
+        if timer is None:
+            self.totals[name] = [0.0, 0]
+            timer = self.timers[name] = PhaseTimer(self.totals, name)
+        return timer
+
+    def as_dict(self):
+        # Seconds and calls of every timed phase
+        return {name: dict(seconds=seconds, calls=calls) for name, (seconds, calls) in self.totals.items()}
+
+NO_PHASE = contextlib.nullcontext()
+QUALITY_FACTOR = 1.01  # A run reaches quality once its best path costs at most this factor of the cost it finished with
+
+def planner_counters(planner):
+    # Work done by one planner run
+    iterations = planner.iteration + 1
+    # Connect keeps a second tree with its own index, the other planners only have the start tree
+    indexes = [planner.index] if not hasattr(planner, 'goal_index') else [planner.start_index, planner.goal_index]
+    # Runs that never reach the goal count all of their iterations
+    to_quality = planner.iterations_to_cost(QUALITY_FACTOR * planner.cost_history[-1][1]) if planner.cost_history else None
+    return dict(
+        iterations=iterations,
+        iterations_to_first_path=planner.cost_history[0][0] + 1 if planner.cost_history else iterations,
+        iterations_to_quality=to_quality + 1 if to_quality is not None else iterations,
+        collision_checks=planner.collision_checks,
+        checks_avoided=planner.checks_avoided,
+        nn_queries=sum(index.queries for index in indexes),
+    )
+
+def segment_summary(planner):
+    # Summary of one planner run: its outcome, counters and phase times
+    cost = planner.cost_to_goal_discovered
+    summary = dict(track=planner.track_name, serial=planner.serial, planner=type(planner).__name__, reached=planner.reached,
+                   cost=float(cost) if cost < float('inf') else None, stop_reason=planner.stop_reason, nodes=len(planner.tree),
+                   build_time=planner.build_time)
+    summary.update(planner_counters(planner))
+    summary['phases'] = planner.timers.as_dict()
+    return summary
+
+def to_json(value):
+    # JSON encoding of the numpy scalars the planners report
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def write_json_line(file_path, record):
+    # Append the record to a JSON-lines file
+    directory = os.path.dirname(file_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(file_path, 'a') as file:
+        file.write(json.dumps(record, default=to_json) + '\n')
+
+
+class SamplingProfiler:
+    # Statistical profiler: a background thread records the call stack of the profiled thread every interval
+    # seconds. It slows the profiled code down far less than cProfile, and writes the stacks in the collapsed
+    # format read by flame graph tools ("outer;inner;innermost count" per line).
+
+    def __init__(self, interval=0.005):
+        # interval: Seconds between two samples
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.thread_id = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        # Start sampling the calling thread
+        self.thread_id = threading.get_ident()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        # Stop sampling and wait for the sampling thread to finish
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        # Sample until stopped
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write(self, file_path):
+        # Write the sampled stacks in collapsed format
+        with open(file_path, 'w') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+PROFILERS = ('cprofile', 'sampling')
+
+@contextlib.contextmanager
+def profiled(output_file, profiler='cprofile'):
+    # Profile the code inside the with block and write the result to output_file: pstats data for 'cprofile'
+    # (read it with python -m pstats), collapsed stacks for 'sampling'. Does nothing when output_file is None.
+    if output_file is None:
+        yield
+        return
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler '{profiler}', expected one of {PROFILERS}")
+    directory = os.path.dirname(output_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if profiler == 'cprofile':
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(output_file)
+    else:
+        sampler = SamplingProfiler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            sampler.write(output_file)
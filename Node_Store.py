@@ -0,0 +1,159 @@
+import numpy as np
+
+class NodeStore:
+    # Compact array-backed storage for the nodes of an RRT* tree.
+    # Nodes are addressed by integer id (their insertion order) and the root has id 0.
+
+    def __init__(self, root, capacity=1024):
+        # root: Point the tree grows from
+        # capacity: Initial number of nodes the store can hold before growing
+        self.x = np.empty(capacity)  # x-coordinate of each node
+        self.y = np.empty(capacity)  # y-coordinate of each node
+        self.parent = np.empty(capacity, dtype=np.int32)  # id of each node's parent, -1 for the root
+        self.cost = np.empty(capacity)  # cached cost-from-start of each node
+        self.length = np.empty(capacity)  # length of the edge from each node's parent, 0 for the root
+        self.first_child = np.empty(capacity, dtype=np.int32)  # id of the most recently attached child, -1 for leaves
+        self.next_sibling = np.empty(capacity, dtype=np.int32)  # next node in the parent's child list, -1 at the end
+        self.prev_sibling = np.empty(capacity, dtype=np.int32)  # previous node in the parent's child list, -1 at the head
+        self.size = 0
+        self.add(root, -1)
+
+    def __len__(self):
+        return self.size
+
+    def grow(self):
+        # Double the capacity of every column, keeping the stored nodes
+        capacity = 2 * len(self.x)
+        for name in ('x', 'y', 'parent', 'cost', 'length', 'first_child', 'next_sibling', 'prev_sibling'):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def add(self, point, parent, length=None):
+        # Append a node below the given parent id and return its id
+        # length: Length of the edge from the parent, e.g. of an arc; the straight distance when None
+        if self.size == len(self.x):
+            self.grow()
+        node_id = self.size
+        self.x[node_id] = point[0]
+        self.y[node_id] = point[1]
+        self.first_child[node_id] = -1
+        self.size += 1
+        if parent < 0:
+            self.parent[node_id] = -1
+            self.next_sibling[node_id] = -1
+            self.prev_sibling[node_id] = -1
+            self.cost[node_id] = 0.0
+            self.length[node_id] = 0.0
+        else:
+            self.link(node_id, parent)
+            self.length[node_id] = self.distance(node_id, parent) if length is None else length
+            self.cost[node_id] = self.cost[parent] + self.length[node_id]
+        return node_id
+
+    def link(self, node_id, parent):
+        # Insert a node at the head of its new parent's child list
+        head = self.first_child[parent]
+        self.parent[node_id] = parent
+        self.prev_sibling[node_id] = -1
+        self.next_sibling[node_id] = head
+        if head >= 0:
+            self.prev_sibling[head] = node_id
+        self.first_child[parent] = node_id
+
+    def unlink(self, node_id):
+        # Remove a node from its current parent's child list
+        prev_id = self.prev_sibling[node_id]
+        next_id = self.next_sibling[node_id]
+        if prev_id >= 0:
+            self.next_sibling[prev_id] = next_id
+        else:
+            self.first_child[self.parent[node_id]] = next_id
+        if next_id >= 0:
+            self.prev_sibling[next_id] = prev_id
+
+    def set_parent(self, node_id, parent, length=None):
+        # Attach a node to a new parent and push the resulting cost change down its subtree
+        # length: Length of the edge from the new parent; the straight distance when None
+        self.unlink(node_id)
+        self.link(node_id, parent)
+        self.length[node_id] = self.distance(node_id, parent) if length is None else length
+        cost = self.cost[parent] + self.length[node_id]
+        delta = cost - self.cost[node_id]
+        self.cost[node_id] = cost
+        if delta != 0:
+            descendants = self.descendants(node_id)
+            if descendants:
+                self.cost[descendants] += delta
+
+    def children(self, node_id):
+        # Return the ids of the direct children of a node
+        ids = []
+        child = self.first_child[node_id]
+        while child >= 0:
+            ids.append(child)
+            child = self.next_sibling[child]
+        return ids
+
+    def descendants(self, node_id):
+        # Return the ids of every node below the given node
+        ids = []
+        stack = [node_id]
+        while stack:
+            child = self.first_child[stack.pop()]
+            while child >= 0:
+                ids.append(child)
+                stack.append(child)
+                child = self.next_sibling[child]
+        return ids
+
+    def distance(self, node_a, node_b):
+        # Euclidean distance between two stored nodes
+        return np.hypot(self.x[node_a] - self.x[node_b], self.y[node_a] - self.y[node_b])
+
+    def recompute_costs(self):
+        # Recompute every cost-from-start from scratch by pointer jumping over the parent links, summing the edge lengths
+        ids = np.arange(self.size)
+        parent = self.parent[:self.size].astype(np.intp)
+        ancestor = np.where(parent >= 0, parent, ids)
+        cost = self.length[:self.size].copy()
+        for _ in range(self.size.bit_length() + 1):
+            if not ancestor.any():
+                return cost
+            cost = cost + cost[ancestor]
+            ancestor = ancestor[ancestor]
+        raise RuntimeError("Tree parent links contain a cycle or a second root")
+
+    def check_costs(self, rtol=1e-9, atol=1e-6):
+        # Compare the cached costs against a full recomputation and fail on the first mismatch
+        expected = self.recompute_costs()
+        mismatched = np.flatnonzero(~np.isclose(self.cost[:self.size], expected, rtol=rtol, atol=atol))
+        if len(mismatched):
+            node_id = mismatched[0]
+            raise RuntimeError(f"Cached cost of node {node_id} is {self.cost[node_id]}, recomputed {expected[node_id]} "
+                               f"({len(mismatched)} mismatched nodes)")
+
+    def point(self, node_id):
+        # Return the coordinates of a node as an (x, y) tuple
+        return (self.x[node_id], self.y[node_id])
+
+    def points(self, ids=None):
+        # Return an (N, 2) array with the coordinates of the given nodes, or of every stored node
+        if ids is None:
+            return np.column_stack((self.x[:self.size], self.y[:self.size]))
+        return np.column_stack((self.x[ids], self.y[ids]))
+
+    def path_to(self, node_id):
+        # Return the node ids from the root to the given node
+        ids = []
+        while node_id >= 0:
+            ids.append(node_id)
+            node_id = self.parent[node_id]
+        ids.reverse()
+        return ids
+
+    def edges(self):
+        # Yield (point, parent point) for every node except the root
+        for node_id in range(1, self.size):
+            yield self.point(node_id), self.point(self.parent[node_id])
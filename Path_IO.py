@@ -0,0 +1,189 @@
+import argparse
+import datetime
+import json
+import os
+import re
+import struct
+import tempfile
+import zipfile
+
+import numpy as np
+
+from Metrics import segment_summary, to_json
+
+# Storage of planned paths. A path is written as an uncompressed .npz archive holding the (N, 2) point array,
+# optionally the planning tree it was read from and per-point columns such as the curvature of a smoothed path,
+# and a JSON metadata record (track, seed, parameters, timings).
+# The arrays of an uncompressed archive lie unchanged in the file, so load_path maps them into memory instead of
+# reading them. The text format of one "(x, y)" tuple per line stays available for reading paths by eye, and the
+# .txt paths written before the binary format are still loaded.
+
+FORMAT_VERSION = 1  # Version of the .npz path layout
+PATH_SUFFIX = '.npz'
+TEXT_SUFFIX = '.txt'
+PLANNER_PARAMETERS = ('max_iter', 'goal_radius', 'step_size', 'search_radius', 'informed', 'lazy', 'time_limit', 'max_stall_iter',
+                      'target_cost', 'turning_radius')
+COLUMN_PREFIX = 'column_'  # Archive name prefix of the per-point columns
+NUMPY_SCALAR = re.compile(r'np\.float\d*\(|[(),]')  # Wrapping of the points printed with str(point) by numpy 2
+
+
+class SavedPath:
+    # A path read by load_path: its points, the metadata and per-point columns stored with it and the planning tree, if one was stored
+
+    def __init__(self, points, metadata=None, version=None, tree_points=None, tree_parents=None, tree_costs=None, columns=None):
+        # points: (N, 2) array of path points
+        # metadata: Dictionary stored with the path, empty for text files
+        # version: Format version of the file, None for text files
+        # tree_points, tree_parents, tree_costs: Node coordinates, parent ids (-1 for the root) and costs of the tree, None when not stored
+        # columns: Arrays of one value per path point by name, e.g. 'curvature'
+        self.points = points
+        self.metadata = metadata if metadata is not None else {}
+        self.version = version
+        self.tree_points = tree_points
+        self.tree_parents = tree_parents
+        self.tree_costs = tree_costs
+        self.columns = columns if columns is not None else {}
+
+    def __len__(self):
+        return len(self.points)
+
+    def as_tuples(self):
+        # The path as the list of (x, y) tuples the planners work with
+        return list(map(tuple, self.points.tolist()))
+
+def path_file(directory, name):
+    # Path of the binary path file called name in the directory, created when missing
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name + PATH_SUFFIX)
+
+def timestamp():
+    # Date and time used in the names of exported files
+    return datetime.datetime.now().strftime("%Y-%m-%d_%H-%M")
+
+def write_atomically(file_path, write, mode='wb'):
+    # Call write with a file opened on a temporary file next to file_path and move it into place in one step,
+    # so an interrupted run never leaves a partial file behind
+    directory = os.path.dirname(file_path) or '.'
+    handle, temporary_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(file_path), suffix='.tmp')
+    try:
+        with os.fdopen(handle, mode) as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(temporary_path, 0o644)
+        os.replace(temporary_path, file_path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+def as_points(points):
+    # (N, 2) float array of a list of (x, y) tuples or an array of points
+    return np.asarray(points, dtype=float).reshape(-1, 2)
+
+def save_path(file_path, points, metadata=None, tree=None, columns=None):
+    # Write the points, the metadata and, when given, the NodeStore tree and per-point columns to a binary path file
+    # metadata: JSON-serializable dictionary, numpy scalars included
+    # columns: Arrays of one value per point by name
+    points = as_points(points)
+    arrays = dict(version=np.array(FORMAT_VERSION), points=points,
+                  metadata=np.array(json.dumps(metadata if metadata is not None else {}, default=to_json)))
+    for name, values in (columns or {}).items():
+        values = np.asarray(values)
+        if len(values) != len(points):
+            raise ValueError(f"Column {name} has {len(values)} values for {len(points)} points")
+        arrays[COLUMN_PREFIX + name] = values
+    if tree is not None:
+        size = len(tree)
+        arrays.update(tree_points=tree.points(), tree_parents=tree.parent[:size].copy(), tree_costs=tree.cost[:size].copy())
+    write_atomically(file_path, lambda file: np.savez(file, **arrays))
+    return file_path
+
+def mapped_arrays(file_path, mmap_mode='r'):
+    # Arrays of an .npz archive by name. Arrays stored uncompressed are mapped into memory, the others
+    # (compressed members and the small 0-d arrays) are read.
+    arrays = {}
+    with zipfile.ZipFile(file_path) as archive, open(file_path, 'rb') as file:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')] if info.filename.endswith('.npy') else info.filename
+            if info.compress_type != zipfile.ZIP_STORED or mmap_mode is None:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+            # The data of a stored member follows its 30-byte local header, file name and extra field
+            file.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', file.read(4))
+            file.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(file)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(file)
+            if not shape or 0 in shape or dtype.hasobject:
+                file.seek(info.header_offset + 30 + name_length + extra_length)
+                arrays[name] = np.lib.format.read_array(file)
+            else:
+                arrays[name] = np.memmap(file_path, dtype=dtype, mode=mmap_mode, offset=file.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+    return arrays
+
+def load_binary_path(file_path, mmap_mode='r'):
+    # Read a binary path file, its arrays mapped into memory unless mmap_mode is None
+    arrays = mapped_arrays(file_path, mmap_mode)
+    version = int(arrays['version'])
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{file_path} has path format {version}, expected {FORMAT_VERSION}")
+    columns = {name[len(COLUMN_PREFIX):]: array for name, array in arrays.items() if name.startswith(COLUMN_PREFIX)}
+    return SavedPath(arrays['points'], json.loads(str(arrays['metadata'])), version,
+                     arrays.get('tree_points'), arrays.get('tree_parents'), arrays.get('tree_costs'), columns)
+
+def load_text_path(file_path):
+    # Read a text path file of one "(x, y)" tuple per line, including the "(np.float64(x), np.float64(y))" lines
+    # written by str(point) under numpy 2
+    with open(file_path) as file:
+        text = NUMPY_SCALAR.sub(' ', file.read())
+    values = np.array(text.split(), dtype=float)
+    if len(values) % 2:
+        raise ValueError(f"{file_path} does not hold (x, y) pairs")
+    return SavedPath(values.reshape(-1, 2))
+
+def load_path(file_path, mmap_mode='r'):
+    # Read a binary or text path file, told apart by the suffix
+    if file_path.endswith(PATH_SUFFIX):
+        return load_binary_path(file_path, mmap_mode)
+    return load_text_path(file_path)
+
+def export_text(file_path, points):
+    # Write the points as one "(x, y)" tuple per line, the format the text path files have always had
+    lines = ''.join(f"({x!r}, {y!r})\n" for x, y in as_points(points).tolist())
+    write_atomically(file_path, lambda file: file.write(lines), mode='w')
+    return file_path
+
+def planner_metadata(planner, **extra):
+    # Metadata stored with the path of a planner run: its summary, seed and parameters, plus the extra entries
+    metadata = segment_summary(planner)
+    metadata.update(created=datetime.datetime.now().isoformat(timespec='seconds'), seed=planner.seed,
+                    parameters={name: getattr(planner, name) for name in PLANNER_PARAMETERS if hasattr(planner, name)})
+    metadata.update(extra)
+    return metadata
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Show or convert path files')
+    commands = parser.add_subparsers(dest='command', required=True)
+    show_parser = commands.add_parser('show', help='Print the metadata and size of path files')
+    show_parser.add_argument('paths', nargs='+', help='Binary or text path files')
+    convert_parser = commands.add_parser('convert', help='Convert a path file between the binary and the text format')
+    convert_parser.add_argument('source', help='Path file to read')
+    convert_parser.add_argument('target', help=f'Path file to write, binary when it ends in {PATH_SUFFIX}, text otherwise')
+    arguments = parser.parse_args()
+    if arguments.command == 'show':
+        for file_path in arguments.paths:
+            saved = load_path(file_path)
+            tree = '' if saved.tree_points is None else f", tree of {len(saved.tree_points)} nodes"
+            columns = f", columns {', '.join(saved.columns)}" if saved.columns else ''
+            print(f"{file_path}: {len(saved)} points{tree}{columns}")
+            if saved.metadata:
+                print(json.dumps(saved.metadata, indent=1))
+    else:
+        saved = load_path(arguments.source, mmap_mode=None)
+        if arguments.target.endswith(PATH_SUFFIX):
+            save_path(arguments.target, saved.points, saved.metadata, columns=saved.columns)
+        else:
+            export_text(arguments.target, saved.points)
@@ -1,27 +1,53 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import datetime
+import logging
+import time
+
+from Collision_Checker import CollisionChecker, EdgeCache, ObstacleSet, cross_product, do_segments_intersect, is_point_on_segment
+from Metrics import PhaseTimers
+from Node_Store import NodeStore
+from Path_IO import path_file, planner_metadata, save_path, timestamp
+from Samplers import ellipse_area, ellipse_sample, in_ellipse
+from Spatial_Index import make_index
+
+logger = logging.getLogger(__name__)
 
 class RRTStar:
     # Class to implement the RRT* algorithm
 
     last_added_point = None
+    informed_attempts = 20  # Draws an informed sample may take before falling back to the plain sampling region
 
     def __init__(self, track_name, x_left, y_left, x_right, y_right, start, goal, obstacles, serial=1, max_iter=7000, goal_radius=12, step_size=10, search_radius=50, 
-                 x_low=-600, x_high=600, y_low=-200, y_high=1100):
+                 x_low=-600, x_high=600, y_low=-200, y_high=1100, nn_index='grid', debug=False, collision_checker=None, seed=None, gamma=None, sampler=None, informed=True,
+                 time_limit=None, max_stall_iter=None, target_cost=None,
+                 lazy=True, edge_cache_size=4096, timed=False):
         # Initialize the RRT* algorithm with the given parameters
         # x_left, y_left: X and Y coordinates of the left boundary of the track
         # x_right, y_right: X and Y coordinates of the right boundary of the track
         # start: Starting point of the path
         # goal: Goal point of the path
-        # obstacles: List of obstacles in the environment
+        # obstacles: ObstacleSet of boundary polylines, or a list of obstacle points forming one closed polyline
         # serial: Serial number of the path
         # max_iter: Maximum number of iterations for the algorithm
         # goal_radius: Radius around the goal point to consider it reached
         # step_size: Distance to extend the tree in each iteration
-        # search_radius: Radius to search for neighbors to rewire
+        # search_radius: Largest radius to search for neighbors to rewire
         # x_low, x_high: Bounds for the x-coordinate of random points
         # y_low, y_high: Bounds for the y-coordinate of random points
+        # nn_index: Nearest-neighbour index for tree lookups ('grid', or 'brute' for the exact reference scan)
+        # debug: Check the cached node costs against a full recomputation after every rewire,
+        #        and every broad-phase collision result against the full scan over the obstacles
+        # collision_checker: Prebuilt CollisionChecker for the obstacles, built here when not given
+        # seed: Seed, or sequence of seeds, for the random number generator of this planner
+        # gamma: Constant of the shrinking connection radius gamma * (log n / n)^(1/2), derived from the sampling area when not given
+        # sampler: Sampler drawing the random points inside a region of the track, e.g. a CorridorSampler; the planner's own sampling when not given
+        # informed: Once the goal is reached, only sample the ellipse of points that could lie on a shorter path
+        # time_limit: Seconds build_rrt_star may run before it stops early, no limit when None
+        # max_stall_iter: Stop once the best path to the goal has not improved for this many iterations, no limit when None
+        # target_cost: Stop once the best path to the goal costs at most this much, no target when None
+        # lazy: Collision-check near nodes only when their cost could make them a parent or a rewired child, caching the results
+        # edge_cache_size: Number of edge collision results the lazy mode remembers
+        # timed: Time the phases of every iteration (sampling, nearest node, collision checks, choosing the parent, rewiring) in timers
         # path = []: List to store the path from start to goal
         
         self.track_name = track_name
@@ -33,78 +59,184 @@ class RRTStar:
         self.goal = goal
         self.goal_radius = goal_radius
         self.goal_discovered = goal
-        self.obstacles = obstacles
+        self.cost_to_goal_discovered = np.inf
+        self.obstacles = obstacles if isinstance(obstacles, ObstacleSet) else ObstacleSet.from_points(obstacles)
+        self.collision_checker = collision_checker if collision_checker is not None else CollisionChecker.from_obstacles(self.obstacles)
         self.serial = serial
         self.max_iter = max_iter
         self.step_size = step_size
         self.search_radius = search_radius
+        self.debug = debug
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.sampler = sampler
+        self.informed = informed
+        self.time_limit = time_limit
+        self.max_stall_iter = max_stall_iter
+        self.target_cost = target_cost
+        self.lazy = lazy
+        self.edge_cache = EdgeCache(edge_cache_size)  # Edge results of the lazy mode, keyed by node ids
+        self.collision_checks = 0  # Edges tested against the obstacles
+        self.checks_avoided = 0  # Near-set edges the lazy mode did not have to test
+        self.stop_reason = None  # Why build_rrt_star stopped: 'max_iter', 'time_limit', 'stalled' or 'target_cost'
+        self.build_time = 0.0  # Seconds the last build_rrt_star call ran for
+        self.timers = PhaseTimers(timed)
         self.x_low = x_low
         self.x_high = x_high
         self.y_low = y_low
         self.y_high = y_high
-        self.tree = {tuple(start): None}
+        self.tree = NodeStore(start)  # Tree nodes by id, matching the ids of the nearest-neighbour index
+        self.goal_id = None  # Id of the node at goal_discovered once the goal is reached
+        self.nn_index = nn_index
+        self.index = make_index(nn_index, cell_size=search_radius)
+        self.index.insert(start)
+        self.goal_ids = []  # Ids of every node within goal_radius of the goal
+        self.gamma = gamma if gamma is not None else self.default_gamma()
+        self.iteration = 0
+        self.cost_history = []  # (iteration, cost) each time the best path to the goal got cheaper
         self.reached = False
         self.reached_again = False
         self.path = []
 
     def generate_random_point(self):
-        # Generate a random point within the specified bounds
-        random_point_x = np.random.uniform(low=self.x_low, high=self.x_high, size=1)[0]
-        random_point_y = np.random.uniform(low=self.y_low, high=self.y_high, size=1)[0]
+        # Generate a random point, restricted to the informed ellipse once a path to the goal is known
+        if self.informed and np.isfinite(self.cost_to_goal_discovered):
+            return self.generate_informed_point()
+        return self.generate_region_point()
+
+    def generate_region_point(self):
+        # Generate a random point within the specified bounds, or from the sampler when one is given
+        if self.sampler is not None:
+            return self.sampler.sample(self.rng)
+        random_point_x = self.rng.uniform(low=self.x_low, high=self.x_high, size=1)[0]
+        random_point_y = self.rng.uniform(low=self.y_low, high=self.y_high, size=1)[0]
         random_point = (random_point_x, random_point_y)
         return tuple(random_point)
 
+    def in_sampling_region(self, point):
+        # Check if point lies in the region random points are drawn from
+        if self.sampler is not None:
+            return self.sampler.contains(point)
+        return self.x_low <= point[0] <= self.x_high and self.y_low <= point[1] <= self.y_high
+
+    def generate_informed_point(self):
+        # Draw a random point from the part of the sampling region that could improve the best path. A path through
+        # a point can only beat the best path if the point lies in the ellipse with the start and goal as foci and the
+        # best cost (plus the goal radius, as paths end anywhere near the goal) as major axis. The smaller of ellipse and
+        # region is sampled and the draws rejected by the other, falling back to a plain draw from the region.
+        major = self.cost_to_goal_discovered + self.goal_radius
+        if ellipse_area(self.start, self.goal, major) < self.sampling_area():
+            for _ in range(self.informed_attempts):
+                point = ellipse_sample(self.rng, self.start, self.goal, major)
+                if self.in_sampling_region(point):
+                    return point
+        else:
+            for _ in range(self.informed_attempts):
+                point = self.generate_region_point()
+                if in_ellipse(point, self.start, self.goal, major):
+                    return point
+        return self.generate_region_point()
+
+    def sampling_area(self):
+        # Area of the region random points are drawn from
+        if self.sampler is not None:
+            return self.sampler.area()
+        return (self.x_high - self.x_low) * (self.y_high - self.y_low)
+
+    def default_gamma(self):
+        # Smallest gamma for which RRT* is asymptotically optimal in the plane: 2 * (1 + 1/2)^(1/2) * (area / pi)^(1/2)
+        return 2 * np.sqrt(1.5) * np.sqrt(self.sampling_area() / np.pi)
+
+    def connection_radius(self):
+        # Shrinking RRT* radius gamma * (log n / n)^(1/2), capped at search_radius and never below one step
+        n = len(self.tree) + 1
+        return max(self.step_size, min(self.search_radius, self.gamma * np.sqrt(np.log(n) / n)))
+
     def find_nearest_point(self, point):
         # Find the nearest point in the tree to the given point
-        distances = [np.linalg.norm(np.array(point) - np.array(p)) for p in self.tree.keys()]
-        nearest_point = list(self.tree.keys())[np.argmin(distances)]
-        return nearest_point
+        return self.tree.point(self.find_nearest_node(point))
+
+    def find_nearest_node(self, point):
+        # Find the id of the tree node nearest to the given point
+        return self.index.nearest(point)
+
+    def near_nodes(self, point, radius):
+        # Ids of the tree nodes within radius of the given point
+        return self.index.within_radius(point, radius)
 
     def is_collision_free(self, point1, point2):
         # Check if the line segment between point1 and point2 is collision-free
-        if self.is_intersecting(self.obstacles, point1, point2):
-            return False
-        return True
+        self.collision_checks += 1
+        with self.timers.phase('collision'):
+            intersecting = self.collision_checker.is_intersecting(point1, point2)
+        if self.debug and intersecting != self.is_intersecting(self.obstacles, point1, point2):
+            raise RuntimeError(f"Broad-phase collision check disagrees with the full scan for edge {point1} - {point2}")
+        return not intersecting
+
+    def are_collision_free(self, points1, point2):
+        # Check the line segments from each of points1 to point2 in one batch and return a mask of the free ones
+        self.collision_checks += len(points1)
+        with self.timers.phase('collision'):
+            intersecting = self.collision_checker.intersecting_mask(points1, point2)
+        if self.debug:
+            for point1, hit in zip(points1, intersecting):
+                if hit != self.is_intersecting(self.obstacles, tuple(point1), point2):
+                    raise RuntimeError(f"Batched collision check disagrees with the full scan for edge {tuple(point1)} - {point2}")
+        return ~intersecting
+
+    def is_edge_free(self, parent_id, child_id, child_point):
+        # Check the edge from a tree node to child_id at child_point, which may not be in the tree yet,
+        # answering from the edge cache when the edge was checked before
+        free = self.edge_cache.get(parent_id, child_id)
+        if free is None:
+            free = self.is_collision_free(self.tree.point(parent_id), child_point)
+            self.edge_cache.put(parent_id, child_id, free)
+        return free
 
     def is_intersecting(self, obstacles, point1, point2):
         # Check if the line segment between point1 and point2 intersects with any of the obstacles
-        for i in range(len(obstacles)):
-            p1 = obstacles[i]
-            p2 = obstacles[(i + 1) % len(obstacles)]
+        # by scanning every obstacle segment (reference for the broad-phase collision_checker)
+        for p1, p2 in obstacles.segments():
             if self.do_segments_intersect(p1, p2, point1, point2):
                 return True
         return False
 
     def do_segments_intersect(self, p1, p2, p3, p4):
         # Check if line segment p1-p2 intersects with line segment p3-p4
-        # Here's an example using the cross product method:
-        d1 = self.cross_product(p3, p4, p1)
-        d2 = self.cross_product(p3, p4, p2)
-        d3 = self.cross_product(p1, p2, p3)
-        d4 = self.cross_product(p1, p2, p4)
-        if d1 * d2 < 0 and d3 * d4 < 0:
-            return True
-        if d1 == 0 and self.is_point_on_segment(p3, p4, p1):
-            return True
-        if d2 == 0 and self.is_point_on_segment(p3, p4, p2):
-            return True
-        if d3 == 0 and self.is_point_on_segment(p1, p2, p3):
-            return True
-        if d4 == 0 and self.is_point_on_segment(p1, p2, p4):
-            return True
-        return False
+        return do_segments_intersect(p1, p2, p3, p4)
 
     def cross_product(self, p1, p2, p3):
         # Calculate the cross product of vectors p1p2 and p1p3
-        return (p2[0] - p1[0]) * (p3[1] - p1[1]) - (p2[1] - p1[1]) * (p3[0] - p1[0])
+        return cross_product(p1, p2, p3)
 
     def is_point_on_segment(self, p1, p2, p):
         # Check if point p lies on the line segment p1-p2
-        return min(p1[0], p2[0]) <= p[0] <= max(p1[0], p2[0]) and min(p1[1], p2[1]) <= p[1] <= max(p1[1], p2[1])
+        return is_point_on_segment(p1, p2, p)
 
     def extend_tree(self, point):
         # Extend the tree towards the given point
-        nearest_point = self.find_nearest_point(point)
+        new_id = self.grow_towards(point)
+        if new_id is not None:
+            new_point = self.tree.point(new_id)
+            # Check if the new point is within goal-radius distance of the goal
+            distance_to_goal = np.linalg.norm(np.array(new_point) - np.array(self.goal))
+            if distance_to_goal <= self.goal_radius:
+                self.goal_ids.append(new_id)
+                logger.debug("Node %d reached the goal region", new_id)
+                self.reached = True
+                self.reached_again = True
+            self.update_goal()
+            return True
+        return False
+
+    def grow_towards(self, point):
+        # Add a node one step from the nearest node towards the given point and rewire around it.
+        # Returns the id of the new node, or None when the step is blocked or no node can reach the point.
+        with self.timers.phase('nearest'):
+            nearest_id = self.find_nearest_node(point)
+        if nearest_id is None:
+            return None
+        nearest_point = self.tree.point(nearest_id)
         direction = np.array(point) - np.array(nearest_point)
         direction = direction/np.linalg.norm(direction)
 
@@ -113,60 +245,145 @@ class RRTStar:
         new_point = tuple(new_point)
 
         if self.is_collision_free(nearest_point, new_point):
-            self.tree[new_point] = nearest_point
+            # Connect the new point through the cheapest collision-free node of its near set,
+            # then rewire the rest of the near set through it
+            with self.timers.phase('near'):
+                near_ids = self.near_nodes(new_point, self.connection_radius())
+            checks = self.collision_checks
+            with self.timers.phase('choose_parent'):
+                if self.lazy:
+                    new_id = len(self.tree)
+                    self.edge_cache.put(nearest_id, new_id, True)
+                    parent_id = self.choose_parent_lazily(new_id, new_point, nearest_id, near_ids)
+                else:
+                    near_ids = near_ids[self.are_collision_free(self.tree.points(near_ids), new_point)]
+                    parent_id = self.choose_parent(new_point, nearest_id, near_ids)
+            new_id = self.tree.add(new_point, parent_id)
+            self.index.insert(new_point)
             self.last_added_point = new_point
-            self.rewire_neighbors(new_point)
-            # Check if the new point is within goal-radius distance of the goal
-            distance_to_goal = np.linalg.norm(np.array(new_point) - np.array(self.goal))
-            if distance_to_goal <= self.goal_radius:
-                self.goal_discovered = new_point          
-                print("EXISTS")
-                self.reached = True
-                self.reached_again = True
-            return True
-        return False
+            with self.timers.phase('rewire'):
+                self.rewire_neighbors(new_id, near_ids, check=self.lazy)
+            if self.lazy:
+                self.checks_avoided += len(near_ids) - (self.collision_checks - checks)
+            return new_id
+        return None
+
+    def edge_lengths(self, parent_ids, x, y):
+        # Lengths of the edges from the given tree nodes to the points at x, y, broadcast against each other
+        return np.hypot(self.tree.x[parent_ids] - x, self.tree.y[parent_ids] - y)
+
+    def choose_parent(self, point, nearest_id, candidate_ids):
+        # Pick the collision-free candidate giving the cheapest path to point, falling back to the nearest node
+        parent_id = nearest_id
+        if len(candidate_ids):
+            costs = self.tree.cost[candidate_ids] + self.edge_lengths(candidate_ids, point[0], point[1])
+            k = np.argmin(costs)
+            if costs[k] < self.get_cost(nearest_id) + self.edge_lengths(nearest_id, point[0], point[1]):
+                parent_id = candidate_ids[k]
+        return int(parent_id)
+
+    def choose_parent_lazily(self, new_id, point, nearest_id, candidate_ids):
+        # Pick the same parent as choose_parent for the node new_id about to be added at point, but collision-check
+        # the candidates in order of cost only until one passes instead of checking all of them up front
+        parent_id = nearest_id
+        if len(candidate_ids):
+            costs = self.tree.cost[candidate_ids] + self.edge_lengths(candidate_ids, point[0], point[1])
+            nearest_cost = self.get_cost(nearest_id) + self.edge_lengths(nearest_id, point[0], point[1])
+            for k in np.argsort(costs, kind='stable'):
+                if not costs[k] < nearest_cost:
+                    break
+                if self.is_edge_free(int(candidate_ids[k]), new_id, point):
+                    parent_id = candidate_ids[k]
+                    break
+        return int(parent_id)
+
+    def rewire_neighbors(self, node_id, neighbor_ids, check=False):
+        # Rewire the given neighbors through the node when that gives them a shorter path.
+        # set_parent pushes the lower cost down to their subtrees.
+        # check: Collision-check the edges of the neighbors that would be rewired, else they are known to be collision-free
+        distances = self.edge_lengths(node_id, self.tree.x[neighbor_ids], self.tree.y[neighbor_ids])
+        improving = self.get_cost(node_id) + distances < self.tree.cost[neighbor_ids]
+        for neighbor_id, distance in zip(neighbor_ids[improving], distances[improving]):
+            # An earlier rewire in this loop may already have lowered this neighbor's cost
+            if self.get_cost(node_id) + distance < self.get_cost(neighbor_id):
+                if check and not self.is_edge_free(node_id, int(neighbor_id), self.tree.point(neighbor_id)):
+                    continue
+                self.tree.set_parent(neighbor_id, node_id, distance)
+        if self.debug:
+            self.tree.check_costs()
 
-    def rewire_neighbors(self, point):
-        # Rewire the neighbors of the given point if a shorter path is found
-        for neighbor in self.tree.keys():
-            if neighbor == point:
-                continue
-            if np.linalg.norm(np.array(neighbor) - np.array(point)) > self.search_radius:
-                continue
-            if self.is_collision_free(neighbor, point):
-                cost = self.get_cost(neighbor) + np.linalg.norm(np.array(neighbor) - np.array(point))
-                if cost < self.get_cost(point):
-                    self.tree[point] = neighbor
-
-    def get_cost(self, point):
-        # Calculate the cost of reaching the given point from the start point
-        cost = 0
-        current_point = point
-        while current_point != self.start:
-            parent = self.tree[current_point]
-            cost += np.linalg.norm(np.array(current_point) - np.array(parent))
-            current_point = parent
-        return cost
-
-    def build_rrt_star(self):
-        # Build the RRT* tree
+    def update_goal(self):
+        # Track the cheapest node within goal_radius; its cost also drops when the tree is rewired
+        if not self.goal_ids:
+            return
+        goal_ids = np.array(self.goal_ids)
+        k = int(np.argmin(self.tree.cost[goal_ids]))
+        cost = self.tree.cost[goal_ids[k]]
+        if cost < self.cost_to_goal_discovered:
+            self.goal_id = int(goal_ids[k])
+            self.goal_discovered = self.tree.point(self.goal_id)
+            self.cost_to_goal_discovered = cost
+            self.cost_history.append((self.iteration, cost))
+            logger.debug("Path to the goal improved to %.2f at iteration %d", cost, self.iteration)
+
+    def iterations_to_cost(self, target_cost):
+        # First iteration at which the best path to the goal cost at most target_cost, None if it never did
+        for iteration, cost in self.cost_history:
+            if cost <= target_cost:
+                return iteration
+        return None
+
+    def get_cost(self, node_id):
+        # Cost of reaching the given node from the start point, cached in the tree
+        return self.tree.cost[node_id]
+
+    def build_rrt_star(self, callback=None):
+        # Build the RRT* tree for up to max_iter iterations, stopping early when one of the budgets runs out
+        # callback: Called with the planner every time the best path to the goal gets cheaper, e.g. to read best_path()
+        started = time.perf_counter()
+        deadline = None if self.time_limit is None else started + self.time_limit
+        reported = 0
+        self.stop_reason = 'max_iter'
         for i in range(self.max_iter):
-            random_point = self.generate_random_point()
-            self.extend_tree(random_point)
+            self.iteration = i
+            with self.timers.phase('sample'):
+                random_point = self.generate_random_point()
+            with self.timers.phase('extend'):
+                self.extend_tree(random_point)
             if self.reached and self.reached_again:
-              print("Total iterations: " +  str(i))
+              logger.debug("Goal region reached at iteration %d", i)
               self.reached_again = False
+            if callback is not None and len(self.cost_history) > reported:
+                reported = len(self.cost_history)
+                callback(self)
+            stop_reason = self.exhausted_budget(deadline)
+            if stop_reason is not None:
+                self.stop_reason = stop_reason
+                break
+        self.build_time = time.perf_counter() - started
+        logger.info("%s segment %d: %s after %d iterations, stopped by %s", self.track_name, self.serial,
+                    f"cost {self.cost_to_goal_discovered:.2f}" if self.reached else "goal not reached", self.iteration + 1, self.stop_reason)
+
+    def exhausted_budget(self, deadline):
+        # Name of the budget that ends the search after the current iteration, None while all budgets remain
+        if self.target_cost is not None and self.cost_to_goal_discovered <= self.target_cost:
+            return 'target_cost'
+        if self.max_stall_iter is not None and self.cost_history and self.iteration - self.cost_history[-1][0] >= self.max_stall_iter:
+            return 'stalled'
+        if deadline is not None and time.perf_counter() >= deadline:
+            return 'time_limit'
+        return None
 
     def plot_rrt_star(self):
         # Plot the RRT* tree and the path from start to goal
         '''
         plt.figure(figsize=(10, 8))
-        for point, parent in self.tree.items():
-            if parent is not None:
-                plt.plot([point[0], parent[0]], [point[1], parent[1]], 'k-', linewidth=0.5)
+        for point, parent in self.tree.edges():
+            plt.plot([point[0], parent[0]], [point[1], parent[1]], 'k-', linewidth=0.5)
         plt.plot(self.x_left, self.y_left, label='Track Left Boundary', linestyle='--', color='red')
         plt.plot(self.x_right, self.y_right, label='Track Right Boundary', linestyle='--', color='green')
-        plt.plot(*zip(*self.obstacles), 'r-', label='Obstacles', linewidth=2)
+        for points, closed in self.obstacles.polylines:
+            plt.plot(points[:, 0], points[:, 1], 'r-', linewidth=2)
         plt.plot(self.start[0], self.start[1], 'go', markersize=5, label='Start')
         plt.plot(self.goal[0], self.goal[1], 'bo', markersize=5, label='Goal')
         plt.xlabel('X')
@@ -184,18 +401,15 @@ class RRTStar:
 
     def get_path(self):
         # Get the path from start to goal
-        current_point = self.goal_discovered
-        while current_point != self.start:
-            self.path.append(current_point)
-            current_point = self.tree[current_point]
-        self.path.append(self.start)
-        self.path.reverse()
+        self.path.extend(self.best_path())
+
+    def best_path(self):
+        # Path from start to the cheapest node found near the goal so far, empty while the goal has not been reached
+        if self.goal_id is None:
+            return []
+        return [self.start] + [self.tree.point(node_id) for node_id in self.tree.path_to(self.goal_id)[1:]]
         
-    def export_path(self):
-        # Export path to path.txt
-        current_datetime = datetime.datetime.now()
-        formatted_datetime = current_datetime.strftime("%Y-%m-%d_%H-%M")
-        with open(f'./Data/paths_found/{self.track_name}_{self.serial}_{formatted_datetime}_path.txt', 'w') as file:
-            for point in self.path:
-                file.write(str(point) + '\n')
+    def export_path(self, directory='./Data/paths_found'):
+        # Export the path with the tree and the metadata of this run to a binary path file in the directory
+        save_path(path_file(directory, f'{self.track_name}_{self.serial}_{timestamp()}_path'), self.path, planner_metadata(self), self.tree)
         return self.path
\ No newline at end of file
@@ -0,0 +1,115 @@
+import numpy as np
+
+from Collision_Checker import EdgeCache
+from Node_Store import NodeStore
+from RRT_Star import RRTStar
+from Spatial_Index import make_index
+
+class RRTStarConnect(RRTStar):
+    # Bidirectional RRT*: grows one tree from the start and one from the goal, alternating between them.
+    # Until the trees first meet, every new node of one tree pulls the other tree towards it until the two
+    # can be joined by a collision-free edge; afterwards new nodes are only joined to nodes already nearby.
+    # Both trees keep choosing parents and rewiring like RRTStar, and the cheapest joint found so far gives
+    # the path. Takes the same parameters as RRTStar.
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.start_tree = self.tree
+        self.start_index = self.index
+        self.start_edge_cache = self.edge_cache
+        self.goal_tree = NodeStore(self.goal)  # Tree rooted at the goal, its costs measured from the goal
+        self.goal_index = make_index(self.nn_index, cell_size=self.search_radius)
+        self.goal_index.insert(self.goal)
+        self.goal_edge_cache = EdgeCache(self.start_edge_cache.capacity)
+        self.active = 0  # Tree extended towards the next random point, 0 for the start tree and 1 for the goal tree
+        self.connections = np.empty((64, 2), dtype=np.intp)  # (start tree node id, goal tree node id) of every joint found between the trees
+        self.connection_count = 0  # Number of rows of connections in use
+        self.connection = None  # Joint of the cheapest path found so far
+
+    def use_tree(self, side):
+        # Point tree, index and edge cache, which the RRTStar steps work on, at the start tree (0) or the goal tree (1)
+        if side == 0:
+            self.tree, self.index, self.edge_cache = self.start_tree, self.start_index, self.start_edge_cache
+        else:
+            self.tree, self.index, self.edge_cache = self.goal_tree, self.goal_index, self.goal_edge_cache
+
+    def extend_tree(self, point):
+        # Extend the active tree towards the given point, pull the other tree towards the new node,
+        # then swap the roles of the trees for the next iteration
+        self.use_tree(self.active)
+        new_id = self.grow_towards(point)
+        if new_id is not None:
+            new_point = self.tree.point(new_id)
+            self.use_tree(1 - self.active)
+            other_id = self.connect(new_point, greedy=not self.reached)
+            if other_id is not None:
+                if self.active == 0:
+                    self.add_connection(new_id, other_id)
+                else:
+                    self.add_connection(other_id, new_id)
+                self.reached = True
+                self.reached_again = True
+        self.active = 1 - self.active
+        self.use_tree(0)
+        self.update_goal()
+        return new_id is not None
+
+    def add_connection(self, start_id, goal_id):
+        # Record a joint between the trees, doubling the connections array when it is full
+        if self.connection_count == len(self.connections):
+            self.connections = np.concatenate((self.connections, np.empty_like(self.connections)))
+        self.connections[self.connection_count] = (start_id, goal_id)
+        self.connection_count += 1
+
+    def connect(self, point, greedy=True):
+        # Grow the current tree towards point until one of its nodes reaches point over a collision-free edge,
+        # or only look for such a node among the existing ones when greedy is False.
+        # Returns the id of the node joining the tree to point with the lowest cost, or None when there is none.
+        steps = int(np.ceil(np.linalg.norm(np.array(point) - np.array(self.find_nearest_point(point))) / self.step_size)) + 1 if greedy else 1
+        for _ in range(steps):
+            joint_id = self.cheapest_joint(self.index.within_radius(point, max(self.step_size, self.connection_radius())), point)
+            if joint_id is not None:
+                return joint_id
+            if not greedy or self.grow_towards(point) is None:
+                return None
+        return None
+
+    def cheapest_joint(self, near_ids, point):
+        # Id of the near node with a collision-free edge to point giving the lowest cost, None when there is none.
+        # The lazy mode checks the nodes in order of cost until one passes.
+        costs = self.tree.cost[near_ids] + np.hypot(self.tree.x[near_ids] - point[0], self.tree.y[near_ids] - point[1])
+        if self.lazy:
+            for k in np.argsort(costs, kind='stable'):
+                if self.is_collision_free(self.tree.point(near_ids[k]), point):
+                    return int(near_ids[k])
+            return None
+        free = self.are_collision_free(self.tree.points(near_ids), point)
+        if not free.any():
+            return None
+        return int(near_ids[np.argmin(np.where(free, costs, np.inf))])
+
+    def update_goal(self):
+        # Track the cheapest joint between the trees; its cost also drops when either tree is rewired
+        if self.connection_count == 0:
+            return
+        start_ids = self.connections[:self.connection_count, 0]
+        goal_ids = self.connections[:self.connection_count, 1]
+        costs = (self.start_tree.cost[start_ids] + self.goal_tree.cost[goal_ids]
+                 + np.hypot(self.start_tree.x[start_ids] - self.goal_tree.x[goal_ids], self.start_tree.y[start_ids] - self.goal_tree.y[goal_ids]))
+        k = int(np.argmin(costs))
+        if costs[k] < self.cost_to_goal_discovered:
+            self.connection = (int(start_ids[k]), int(goal_ids[k]))
+            self.goal_id = self.connection[0]  # Start tree end of the joint
+            self.goal_discovered = self.goal
+            self.cost_to_goal_discovered = costs[k]
+            self.cost_history.append((self.iteration, costs[k]))
+
+    def best_path(self):
+        # Path from start to goal through the cheapest joint found so far, empty while the trees have not met
+        if self.connection is None:
+            return []
+        start_id, goal_id = self.connection
+        path = [self.start] + [self.start_tree.point(node_id) for node_id in self.start_tree.path_to(start_id)[1:]]
+        # The goal tree is walked from the joint back to its root at the goal
+        path += [self.goal_tree.point(node_id) for node_id in reversed(self.goal_tree.path_to(goal_id))]
+        return path
@@ -0,0 +1,75 @@
+import numpy as np
+
+from RRT_Star import RRTStar
+
+class RRTStarLap(RRTStar):
+    # RRT* over one whole lap of a closed circuit with a single tree. Every node carries its progress, the
+    # station along the centerline it was reached at, counted from the start without wrapping. Nodes only
+    # connect to nodes of similar progress, so the tree has to go once around the track, and the goal is
+    # the start point again after a full lap. Takes the same parameters as RRTStar, with start and goal
+    # both being the start point and sampler a CorridorSampler covering the full lap from it.
+
+    lookahead = 50  # How far beyond the furthest progress random points may be drawn before the lap is closed
+    frontier_bias = 0.5  # Share of random points drawn near the furthest progress before the lap is closed
+    progress_window = 150  # Largest difference in progress between connected nodes
+    reach = 100  # Radius searched for the nearest node of a random point
+
+    def __init__(self, *args, **kwargs):
+        kwargs['informed'] = False  # The informed ellipse is a circle around the start covering the whole lap
+        super().__init__(*args, **kwargs)
+        if self.sampler is None:
+            raise ValueError("RRTStarLap needs a sampler covering the full lap")
+        self.lap_length = self.sampler.s[-1]
+        self.progress = np.zeros(1024)  # Progress of each node by id
+        self.frontier = 0.0  # Furthest progress of any node
+        self.sample_station = 0.0  # Station of the last random point
+
+    @classmethod
+    def track_job(cls, init):
+        # Constructor arguments of the planner for one lap of the track from its first centerline point,
+        # with an iteration budget growing with the length of the track
+        start = (init.x[0], init.y[0])
+        args = (init.track_name, init.x_left, init.y_left, init.x_right, init.y_right, start, start, init.obstacles)
+        kwargs = dict(collision_checker=init.collision_checker, sampler=init.corridor_sampler(0, len(init.x)), max_iter=10 * len(init.x))
+        return args, kwargs
+
+    def generate_region_point(self):
+        # Draw a random point from the part of the lap explored so far plus the lookahead, half of them
+        # close to the frontier until the lap is closed, and from the whole lap afterwards
+        high = min(self.lap_length, self.frontier + self.lookahead)
+        low = 0
+        if not self.reached and self.rng.uniform() < self.frontier_bias:
+            low = max(0, self.frontier - self.lookahead)
+        point, self.sample_station = self.sampler.sample_with_station(self.rng, low, high)
+        return point
+
+    def find_nearest_node(self, point):
+        # Find the id of the nearest node of similar progress to the last random point, None when none is in reach
+        ids = self.near_nodes(point, self.reach)
+        if len(ids) == 0:
+            return None
+        return int(ids[np.argmin(np.hypot(self.tree.x[ids] - point[0], self.tree.y[ids] - point[1]))])
+
+    def near_nodes(self, point, radius):
+        # Ids of the tree nodes within radius of the given point whose progress is close to the last random point
+        ids = self.index.within_radius(point, radius)
+        return ids[np.abs(self.progress[ids] - self.sample_station) <= self.progress_window]
+
+    def extend_tree(self, point):
+        # Extend the tree towards the given point, record the progress of the new node and check if it closes the lap
+        new_id = self.grow_towards(point)
+        if new_id is None:
+            return False
+        if new_id == len(self.progress):
+            self.progress = np.concatenate((self.progress, np.zeros_like(self.progress)))
+        new_point = self.tree.point(new_id)
+        self.progress[new_id] = self.sampler.station_of(new_point, self.sample_station, self.progress_window)
+        self.frontier = max(self.frontier, self.progress[new_id])
+        # The lap is closed by a node within goal-radius distance of the start that has gone around the track
+        distance_to_goal = np.linalg.norm(np.array(new_point) - np.array(self.goal))
+        if distance_to_goal <= self.goal_radius and self.progress[new_id] >= self.lap_length - self.progress_window:
+            self.goal_ids.append(new_id)
+            self.reached = True
+            self.reached_again = True
+        self.update_goal()
+        return True
@@ -1,74 +1,69 @@
 import numpy as np
-import datetime
+import logging
 
-import matplotlib.pyplot as plt
+from Collision_Checker import EdgeCache
+from Path_IO import path_file, planner_metadata, save_path, timestamp
+from RRT_Star import RRTStar
 
-class RRTStar_M:
-    # Class to implement the RRT* algorithm
+logger = logging.getLogger(__name__)
 
-    last_added_point = None
 
-    def __init__(self, track_name, p_start, x_left, y_left, x_right, y_right, start, goal, obstacles, serial=1, max_iter=75, goal_radius=12, step_size=10, search_radius=50, 
-                 x_low=-600, x_high=600, y_low=-200, y_high=1100):
-        # Initialize the RRT* algorithm with the given parameters
-        # track_name: Name of the track
+def wrap_angle(angle):
+    # Wrap an angle, or array of angles, in radians to [-pi, pi)
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
+def arc_turns(x, y, heading, to_x, to_y):
+    # Half the heading change of the circular arc leaving (x, y) along heading and ending at (to_x, to_y),
+    # wrapped to [-pi, pi), and the length of its chord; the arc arrives with heading + 2 * turn
+    dx, dy = to_x - x, to_y - y
+    return wrap_angle(np.arctan2(dy, dx) - heading), np.hypot(dx, dy)
+
+
+class RRTStar_M(RRTStar):
+    # RRT* for one segment of a lap, sampling the cone ahead of the start instead of a box, optionally steering
+    # along circular arcs no tighter than a turning radius. Takes the same parameters as RRTStar, with the point
+    # before the start after the track name and a default of 75 iterations, plus turning_radius and goal_heading.
+
+    sampling_distance_margin = 10  # How far beyond the goal distance random points may be drawn
+    arc_pieces = 4  # Straight pieces an arc edge is split into for collision checking
+    rewire_heading_tolerance = np.deg2rad(10)  # Largest change of a node's heading a rewire may cause when turning_radius is set
+    goal_heading_tolerance = np.deg2rad(30)  # Largest angle between the heading of a node reaching the goal and goal_heading
+
+    def __init__(self, track_name, p_start, x_left, y_left, x_right, y_right, start, goal, obstacles, serial=1, max_iter=75, *args,
+                 turning_radius=None, goal_heading=None, **kwargs):
         # p_start: Point before start
-        # start_index: Index of the starting point in the init object
-        # x_left, y_left: X and Y coordinates of the left boundary of the track
-        # x_right, y_right: X and Y coordinates of the right boundary of the track
-        # start: Starting point of the path
-        # goal: Goal point of the path
-        # obstacles: List of obstacles in the environment
-        # serial: Serial number of the path
-        # max_iter: Maximum number of iterations for the algorithm
-        # goal_radius: Radius around the goal point to consider it reached
-        # step_size: Distance to extend the tree in each iteration
-        # search_radius: Radius to search for neighbors to rewire
-        # x_low, x_high: Bounds for the x-coordinate of random points
-        # y_low, y_high: Bounds for the y-coordinate of random points
-        # path: List to store the path from start to goal
-        
+        # turning_radius: Smallest radius the path may turn with. Every node then has a heading and is joined to its parent
+        #                 by a circular arc leaving the parent along the parent's heading; straight edges when None
+        # goal_heading: Direction of the track at the goal; with turning_radius set, only nodes heading along it reach the goal,
+        #               so the next segment does not start facing the track boundary. Any heading reaches the goal when None
         self.p_start = p_start
-        self.track_name = track_name
-        self.x_left = x_left
-        self.y_left = y_left
-        self.x_right = x_right
-        self.y_right = y_right
-        self.start = start
-        self.goal = goal
-        self.goal_radius = goal_radius
-        self.goal_discovered = goal
-        self.cost_to_goal_discovered = 2147483647
-        self.obstacles = obstacles
-        self.serial = serial
-        self.max_iter = max_iter
-        self.step_size = step_size
-        self.search_radius = search_radius
-        self.x_low = x_low
-        self.x_high = x_high
-        self.y_low = y_low
-        self.y_high = y_high
-        self.tree = {tuple(start): None}
-        self.reached = False
-        self.reached_again = False
-        self.path = []
-
-    def generate_random_point(self):
-        # Generate a random point within the specified bounds
+        self.turning_radius = turning_radius
+        self.goal_heading = goal_heading
+        super().__init__(track_name, x_left, y_left, x_right, y_right, start, goal, obstacles, serial, max_iter, *args, **kwargs)
+        # Arcs are driven from parent to child, so their results are keyed by direction
+        self.edge_cache = EdgeCache(self.edge_cache.capacity, directed=turning_radius is not None)
+        self.heading = np.zeros(1024)  # Heading of each node by id, the direction arcs leave it in when turning_radius is set
+        self.heading[0] = self.start_heading()
+        # Warn when the goal lies more than 30 degrees off the heading at the start
+        goal_bearing = np.rad2deg(wrap_angle(np.arctan2(goal[1] - start[1], goal[0] - start[0]) - self.heading[0]))
+        if abs(goal_bearing) > 30:
+            logger.warning("%s segment %d: the goal lies %.0f degrees off the heading at the start", track_name, serial, goal_bearing)
+
+    def generate_region_point(self):
+        # Generate a random point in the cone ahead of the start, or from the sampler when one is given
+        if self.sampler is not None:
+            return self.sampler.sample(self.rng)
         #p1 = self.init.x[self.start_index+1]
         #p2 = self.init.y[self.start_index+2]
         
-        angle = np.arctan2(self.start[1] - self.p_start[1], self.start[0] - self.p_start[0])
-        angle2 = np.arctan2(self.goal[1] - self.start[1], self.goal[0] - self.start[0])
-        if angle2 < angle -30 or angle2 > angle + 30:
-            print("IMPOSIBLE")
+        angle = self.start_heading()
         distance = np.linalg.norm(np.array(self.start) - np.array(self.goal))
-        max_distance = distance + 10
+        max_distance = distance + self.sampling_distance_margin
         min_angle = angle - np.deg2rad(60)
         max_angle = angle + np.deg2rad(60)
         
-        random_distance = np.random.uniform(low=0, high=max_distance, size=1)[0]
-        random_angle = np.random.uniform(low=min_angle, high=max_angle, size=1)[0]
+        random_distance = self.rng.uniform(low=0, high=max_distance, size=1)[0]
+        random_angle = self.rng.uniform(low=min_angle, high=max_angle, size=1)[0]
         
         random_point_x = self.start[0] + random_distance * np.cos(random_angle)
         random_point_y = self.start[1] + random_distance * np.sin(random_angle)
@@ -76,151 +71,219 @@ class RRTStar_M:
         
         return tuple(random_point)
 
-    def find_nearest_point(self, point):
-        # Find the nearest point in the tree to the given point
-        distances = [np.linalg.norm(np.array(point) - np.array(p)) for p in self.tree.keys()]
-        nearest_point = list(self.tree.keys())[np.argmin(distances)]
-        return nearest_point
+    def in_sampling_region(self, point):
+        # Check if point lies in the region random points are drawn from
+        if self.sampler is not None:
+            return self.sampler.contains(point)
+        max_distance = np.linalg.norm(np.array(self.start) - np.array(self.goal)) + self.sampling_distance_margin
+        offset = np.array(point) - np.array(self.start)
+        # Difference between the heading of the point and the cone axis
+        angle_difference = wrap_angle(np.arctan2(offset[1], offset[0]) - self.start_heading())
+        return np.linalg.norm(offset) <= max_distance and abs(angle_difference) <= np.deg2rad(60)
 
-    def is_collision_free(self, point1, point2):
-        # Check if the line segment between point1 and point2 is collision-free
-        if self.is_intersecting(self.obstacles, point1, point2):
-            return False
-        return True
+    def start_heading(self):
+        # Heading at the start, from the point before it towards it
+        return np.arctan2(self.start[1] - self.p_start[1], self.start[0] - self.p_start[0])
 
-    def is_intersecting(self, obstacles, point1, point2):
-        # Check if the line segment between point1 and point2 intersects with any of the obstacles
-        for i in range(len(obstacles)):
-            p1 = obstacles[i]
-            p2 = obstacles[(i + 1) % len(obstacles)]
-            if self.do_segments_intersect(p1, p2, point1, point2):
-                return True
-        return False
-
-    def do_segments_intersect(self, p1, p2, p3, p4):
-        # Check if line segment p1-p2 intersects with line segment p3-p4
-        # Here's an example using the cross product method:
-        d1 = self.cross_product(p3, p4, p1)
-        d2 = self.cross_product(p3, p4, p2)
-        d3 = self.cross_product(p1, p2, p3)
-        d4 = self.cross_product(p1, p2, p4)
-        if d1 * d2 < 0 and d3 * d4 < 0:
-            return True
-        if d1 == 0 and self.is_point_on_segment(p3, p4, p1):
-            return True
-        if d2 == 0 and self.is_point_on_segment(p3, p4, p2):
-            return True
-        if d3 == 0 and self.is_point_on_segment(p1, p2, p3):
-            return True
-        if d4 == 0 and self.is_point_on_segment(p1, p2, p4):
+    @classmethod
+    def sampling_bounds(cls, start, goal):
+        # Return (x_low, x_high, y_low, y_high) of a box holding every point the tree can reach:
+        # samples lie within the goal distance plus margin of start, and new nodes step towards them
+        reach = np.linalg.norm(np.array(start) - np.array(goal)) + cls.sampling_distance_margin
+        return start[0] - reach, start[0] + reach, start[1] - reach, start[1] + reach
+
+    def sampling_area(self):
+        # Area of the cone random points are drawn from: a 120 degree sector around the start
+        if self.sampler is not None:
+            return self.sampler.area()
+        radius = np.linalg.norm(np.array(self.start) - np.array(self.goal)) + self.sampling_distance_margin
+        return np.pi * radius**2 / 3
+
+    def find_nearest_node(self, point):
+        # Find the id of the tree node nearest to the given point, by kinematic_distance when turning_radius is set
+        nearest_id = self.index.nearest(point)
+        if self.turning_radius is None:
+            return nearest_id
+        # The kinematic distance is never shorter than the straight one, so only nodes within the kinematic
+        # distance of the straight-line nearest node can be nearer
+        bound = self.kinematic_distance(np.array([nearest_id]), point)[0]
+        ids = self.index.within_radius(point, bound + 1e-9) if np.isfinite(bound) else np.arange(len(self.tree))
+        distances = self.kinematic_distance(ids, point)
+        k = int(np.argmin(distances))
+        return int(ids[k]) if np.isfinite(distances[k]) else nearest_id
+
+    def kinematic_distance(self, node_ids, point):
+        # Length of the shortest forward path from each node, leaving along its heading, to point without turning
+        # tighter than turning_radius: one arc when it reaches point, else the shorter Dubins curve of a full-lock turn
+        # followed by a straight line. Infinite when point lies inside both full-lock circles of a node.
+        x, y, heading = self.tree.x[node_ids], self.tree.y[node_ids], self.heading[node_ids]
+        radius = self.turning_radius
+        turns, chords = arc_turns(x, y, heading, point[0], point[1])
+        # sin(turn) / turn is np.sinc(turn / pi), also for a straight arc
+        distances = np.where(self.on_arc(turns, chords), chords / np.sinc(turns / np.pi), np.inf)
+        for side in (1, -1):  # Turning left, then turning right
+            center_x, center_y = x - side * radius * np.sin(heading), y + side * radius * np.cos(heading)
+            to_center = np.hypot(point[0] - center_x, point[1] - center_y)
+            outside = to_center >= radius
+            # Angles around the center of the node and of the point where the line to point leaves the circle
+            start_angle = heading - side * np.pi / 2
+            leave_angle = np.arctan2(point[1] - center_y, point[0] - center_x) - side * np.arccos(np.minimum(radius / np.maximum(to_center, 1e-12), 1))
+            turn = (side * (leave_angle - start_angle)) % (2 * np.pi)
+            lengths = radius * turn + np.sqrt(np.maximum(to_center**2 - radius**2, 0))
+            distances = np.where(outside, np.minimum(distances, lengths), distances)
+        return distances
+
+    def on_arc(self, turns, chords):
+        # Mask of the arcs, given by arc_turns, that go forward and turn no tighter than turning_radius
+        return (np.abs(turns) < np.pi / 2) & (2 * self.turning_radius * np.abs(np.sin(turns)) <= chords + 1e-9)
+
+    def reachable_on_arc(self, node_ids, point):
+        # Mask of the nodes that can be the parent of point, joined to it by an arc no tighter than turning_radius
+        return self.on_arc(*arc_turns(self.tree.x[node_ids], self.tree.y[node_ids], self.heading[node_ids], point[0], point[1]))
+
+    def keeps_heading(self, node_id, child_ids):
+        # Mask of the nodes that node_id can become the parent of: reachable on an arc from it and arriving within
+        # rewire_heading_tolerance of their current heading, so the arcs to their own children stay drivable
+        turns, chords = arc_turns(self.tree.x[node_id], self.tree.y[node_id], self.heading[node_id], self.tree.x[child_ids], self.tree.y[child_ids])
+        arriving = wrap_angle(self.heading[node_id] + 2 * turns - self.heading[child_ids])
+        return self.on_arc(turns, chords) & (np.abs(arriving) <= self.rewire_heading_tolerance)
+
+    def arrives_in_line(self, node_id):
+        # Check if the node may end the path: with a turning radius and a goal heading, its own heading has to be
+        # within goal_heading_tolerance of the goal heading, and one step straight ahead has to be collision-free
+        # so that the next segment can leave it
+        if self.turning_radius is None or self.goal_heading is None:
             return True
-        return False
+        if abs(wrap_angle(self.heading[node_id] - self.goal_heading)) > self.goal_heading_tolerance:
+            return False
+        point = self.tree.point(node_id)
+        ahead = (point[0] + self.step_size * np.cos(self.heading[node_id]), point[1] + self.step_size * np.sin(self.heading[node_id]))
+        return self.is_collision_free(point, ahead)
+
+    def steer(self, node_id, point):
+        # Point one step along the arc leaving the node towards point: the arc through point when it is no tighter
+        # than turning_radius, else the full-lock arc turning towards it
+        turns, chords = arc_turns(self.tree.x[node_id], self.tree.y[node_id], self.heading[node_id], point[0], point[1])
+        turn, chord = float(turns), float(chords)
+        if self.on_arc(turn, chord):
+            length = chord / np.sinc(turn / np.pi)
+            if length <= self.step_size:
+                return tuple(point)
+            return self.arc_points(node_id, turn, chord, [self.step_size / length])[0]
+        # A full-lock arc of one step, less than half a circle
+        turn = np.copysign(min(self.step_size / (2 * self.turning_radius), np.pi / 2 - 1e-6), turn)
+        return self.arc_points(node_id, turn, 2 * self.turning_radius * np.sin(abs(turn)), [1])[0]
+
+    def arc_points(self, node_id, turn, chord, fractions):
+        # Points at the given fractions along the arc leaving the node with half heading change turn and the given chord
+        fractions = np.asarray(fractions, dtype=float)
+        heading = self.heading[node_id] + turn * fractions
+        # The chord to a point part of the way along an arc turns half as much as the arc up to that point
+        distances = chord * fractions * np.sinc(turn * fractions / np.pi) / np.sinc(turn / np.pi)
+        return [(self.tree.x[node_id] + d * np.cos(h), self.tree.y[node_id] + d * np.sin(h)) for d, h in zip(distances, heading)]
+
+    def is_arc_free(self, parent_id, point):
+        # Check the arc from a tree node to point, split into arc_pieces straight pieces, against the obstacles
+        self.collision_checks += 1
+        turns, chords = arc_turns(self.tree.x[parent_id], self.tree.y[parent_id], self.heading[parent_id], point[0], point[1])
+        points = [self.tree.point(parent_id)] + self.arc_points(parent_id, float(turns), float(chords), np.arange(1, self.arc_pieces + 1) / self.arc_pieces)
+        with self.timers.phase('collision'):
+            intersecting = self.collision_checker.intersecting_mask(points[:-1], points[1:])
+        if self.debug:
+            for point1, point2, hit in zip(points[:-1], points[1:], intersecting):
+                if hit != self.is_intersecting(self.obstacles, point1, point2):
+                    raise RuntimeError(f"Batched collision check disagrees with the full scan for edge {point1} - {point2}")
+        return not intersecting.any()
 
-    def cross_product(self, p1, p2, p3):
-        # Calculate the cross product of vectors p1p2 and p1p3
-        return (p2[0] - p1[0]) * (p3[1] - p1[1]) - (p2[1] - p1[1]) * (p3[0] - p1[0])
+    def edge_lengths(self, parent_ids, x, y):
+        # Lengths of the edges from the given tree nodes to the points at x, y as RRTStar measures them, or of the arcs
+        # leaving the nodes along their headings when turning_radius is set
+        if self.turning_radius is None:
+            return super().edge_lengths(parent_ids, x, y)
+        turns, chords = arc_turns(self.tree.x[parent_ids], self.tree.y[parent_ids], self.heading[parent_ids], x, y)
+        # sin(turn) / turn is np.sinc(turn / pi), also for a straight arc
+        return chords / np.sinc(turns / np.pi)
 
-    def is_point_on_segment(self, p1, p2, p):
-        # Check if point p lies on the line segment p1-p2
-        return min(p1[0], p2[0]) <= p[0] <= max(p1[0], p2[0]) and min(p1[1], p2[1]) <= p[1] <= max(p1[1], p2[1])
+    def is_edge_free(self, parent_id, child_id, child_point):
+        # Check the edge from a tree node to child_id at child_point as RRTStar does, along the arc when turning_radius is set
+        if self.turning_radius is None:
+            return super().is_edge_free(parent_id, child_id, child_point)
+        free = self.edge_cache.get(parent_id, child_id)
+        if free is None:
+            free = self.is_arc_free(parent_id, child_point)
+            self.edge_cache.put(parent_id, child_id, free)
+        return free
 
     def extend_tree(self, point):
-        # Extend the tree towards the given point
-        nearest_point = self.find_nearest_point(point)
-        direction = np.array(point) - np.array(nearest_point)
-        direction = direction/np.linalg.norm(direction)
-
-        # Calculate the potential new point by stepping towards the given point
-        new_point = np.array(nearest_point) + self.step_size * direction
-        new_point = tuple(new_point)
-
-        if self.is_collision_free(nearest_point, new_point):
-            self.tree[new_point] = nearest_point
-            self.last_added_point = new_point
-            self.rewire_neighbors(new_point)
-            # Check if the new point is within goal-radius distance of the goal
-            distance_to_goal = np.linalg.norm(np.array(new_point) - np.array(self.goal))
-            if distance_to_goal <= self.goal_radius:
-                if self.get_cost(new_point) < self.cost_to_goal_discovered:
-                    self.goal_discovered = new_point
-                    self.cost_to_goal_discovered = self.get_cost(new_point)
-                    print("Goal discovered updated")
-                print("EXISTS")
-                self.reached = True
-                self.reached_again = True
-            return True
-        return False
-
-    def rewire_neighbors(self, point):
-        # Rewire the neighbors of the given point if a shorter path is found
-        for neighbor in self.tree.keys():
-            if neighbor == point:
-                continue
-            if np.linalg.norm(np.array(neighbor) - np.array(point)) > self.search_radius:
-                continue
-            if self.is_collision_free(neighbor, point):
-                cost = self.get_cost(neighbor) + np.linalg.norm(np.array(neighbor) - np.array(point))
-                if cost < self.get_cost(point):
-                    self.tree[point] = neighbor
-
-    def get_cost(self, point):
-        # Calculate the cost of reaching the given point from the start point
-        cost = 0
-        current_point = point
-        while current_point != self.start:
-            parent = self.tree[current_point]
-            cost += np.linalg.norm(np.array(current_point) - np.array(parent))
-            current_point = parent
-        return cost
-
-    def build_rrt_star(self):
-        # Build the RRT* tree
-        for i in range(self.max_iter):
-            random_point = self.generate_random_point()
-            self.extend_tree(random_point)
-            if self.reached and self.reached_again:
-              print("Total iterations: " +  str(i))
-              self.reached_again = False
-
-    def plot_rrt_star(self):
-        # Plot the RRT* tree and the path from start to goal
-        '''
-        plt.figure(figsize=(10, 8))
-        for point, parent in self.tree.items():
-            if parent is not None:
-                plt.plot([point[0], parent[0]], [point[1], parent[1]], 'k-', linewidth=0.5)
-        plt.plot(self.x_left, self.y_left, label='Track Left Boundary', linestyle='--', color='red')
-        plt.plot(self.x_right, self.y_right, label='Track Right Boundary', linestyle='--', color='green')
-        plt.plot(*zip(*self.obstacles), 'r-', label='Obstacles', linewidth=2)
-        plt.plot(self.start[0], self.start[1], 'go', markersize=5, label='Start')
-        plt.plot(self.goal[0], self.goal[1], 'bo', markersize=5, label='Goal')
-        plt.xlabel('X')
-        plt.ylabel('Y')
-        plt.title('RRT* Path Planning')
-        plt.grid(True)
-        '''
-        # Plot the path from start to goal
-        if self.reached:
-           self.get_path()
-           #x_path, y_path = zip(*(self.path))
-           #plt.plot(x_path, y_path, 'g-', label='Segment path', linewidth=2)        
-        #plt.legend()
-        #plt.show()
-
-    def get_path(self):
-        # Get the path from start to goal
-        current_point = self.goal_discovered
-        while current_point != self.start:
-            self.path.append(current_point)
-            current_point = self.tree[current_point]
-        self.path.append(self.start)
-        self.path.reverse()
-        
-    def export_path(self):
-        # Export path to path.txt
-        current_datetime = datetime.datetime.now()
-        formatted_datetime = current_datetime.strftime("%Y-%m-%d_%H-%M")
-        with open(f'./Data/paths_found/{self.track_name}_{self.serial}_{formatted_datetime}_pathM.txt', 'w') as file:
-            for point in self.path:
-                file.write(str(point) + '\n')
-        return self.path
\ No newline at end of file
+        # Extend the tree towards the given point; with a turning radius and a goal heading a new node near the goal
+        # only reaches it when it arrives in line with the track
+        new_id = self.grow_towards(point)
+        if new_id is None:
+            return False
+        # Check if the new point is within goal-radius distance of the goal
+        distance_to_goal = np.linalg.norm(np.array(self.tree.point(new_id)) - np.array(self.goal))
+        if distance_to_goal <= self.goal_radius and self.arrives_in_line(new_id):
+            self.goal_ids.append(new_id)
+            logger.debug("Node %d reached the goal region", new_id)
+            self.reached = True
+            self.reached_again = True
+        self.update_goal()
+        return True
+
+    def grow_towards(self, point):
+        # Add a node one step along the arc from the nearest node towards the given point and rewire around it,
+        # stepping straight as RRTStar does when turning_radius is None.
+        # Returns the id of the new node, or None when the step is blocked.
+        if self.turning_radius is None:
+            return super().grow_towards(point)
+        with self.timers.phase('nearest'):
+            nearest_id = self.find_nearest_node(point)
+        new_point = self.steer(nearest_id, point)
+        if not self.is_arc_free(nearest_id, new_point):
+            return None
+        with self.timers.phase('near'):
+            near_ids = self.near_nodes(new_point, self.connection_radius())
+        checks = self.collision_checks
+        new_id = len(self.tree)
+        if new_id == len(self.heading):
+            self.heading = np.concatenate((self.heading, np.zeros_like(self.heading)))
+        with self.timers.phase('choose_parent'):
+            # Arcs depend on the heading of their parent, so they are checked one by one instead of in a straight-line batch
+            candidate_ids = near_ids[self.reachable_on_arc(near_ids, new_point)]
+            if self.lazy:
+                self.edge_cache.put(nearest_id, new_id, True)
+                parent_id = self.choose_parent_lazily(new_id, new_point, nearest_id, candidate_ids)
+            else:
+                free = np.array([self.is_arc_free(candidate_id, new_point) for candidate_id in candidate_ids], dtype=bool)
+                parent_id = self.choose_parent(new_point, nearest_id, candidate_ids[free])
+            turn = arc_turns(self.tree.x[parent_id], self.tree.y[parent_id], self.heading[parent_id], new_point[0], new_point[1])[0]
+            self.heading[new_id] = wrap_angle(self.heading[parent_id] + 2 * turn)
+        new_id = self.tree.add(new_point, parent_id, self.edge_lengths(parent_id, new_point[0], new_point[1]))
+        self.index.insert(new_point)
+        self.last_added_point = new_point
+        with self.timers.phase('rewire'):
+            # Rewiring keeps the headings, so only neighbors whose heading barely changes are rewired. The arc to a
+            # neighbor is not the one checked from it when choosing the parent, so rewired edges are always checked.
+            self.rewire_neighbors(new_id, near_ids[self.keeps_heading(new_id, near_ids)], check=True)
+        if self.lazy:
+            self.checks_avoided += len(near_ids) - (self.collision_checks - checks)
+        return new_id
+
+    def best_path(self):
+        # Path from start to the cheapest node found near the goal so far, empty while the goal has not been reached.
+        # With a turning radius every edge is given by the arc_pieces straight pieces it was collision-checked as.
+        if self.turning_radius is None or self.goal_id is None:
+            return super().best_path()
+        node_ids = self.tree.path_to(self.goal_id)
+        fractions = np.arange(1, self.arc_pieces) / self.arc_pieces
+        path = [self.start]
+        for parent_id, node_id in zip(node_ids[:-1], node_ids[1:]):
+            turns, chords = arc_turns(self.tree.x[parent_id], self.tree.y[parent_id], self.heading[parent_id], self.tree.x[node_id], self.tree.y[node_id])
+            path.extend(self.arc_points(parent_id, float(turns), float(chords), fractions))
+            path.append(self.tree.point(node_id))
+        return path
+
+    def export_path(self, directory='./Data/paths_found'):
+        # Export the path with the tree and the metadata of this run to a binary path file in the directory
+        save_path(path_file(directory, f'{self.track_name}_{self.serial}_{timestamp()}_pathM'), self.path, planner_metadata(self), self.tree)
+        return self.path
@@ -0,0 +1,76 @@
+import os
+
+# Plotting for the planners and drivers. matplotlib is only imported once a plot is requested,
+# so planning runs that do not plot never pay for it.
+
+def get_pyplot(headless):
+    # Import pyplot on first use; headless figures are drawn with the non-interactive Agg backend
+    import matplotlib
+    if headless:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def finish(plt, output):
+    # Show the current figure, or write it to output (format taken from the extension, e.g. .png or .svg)
+    if output is None:
+        plt.show()
+        return
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    plt.savefig(output, bbox_inches='tight')
+    plt.close()
+
+def plot_track(init, output=None):
+    # Plot the track and its boundaries
+    plt = get_pyplot(output is not None)
+    plt.figure(figsize=(30, 20))
+    plt.plot(init.x, init.y, label='Track Centerline', color='blue')
+    plt.plot(init.x_right, init.y_right, linestyle='--', label='Track Right Boundary', color='green')
+    plt.plot(init.x_left, init.y_left, linestyle='--', label='Track Left Boundary', color='red')
+    plt.plot(init.x_right_obs, init.y_right_obs, linestyle='--', label='Obstacle Right Boundary', color='orange')
+    plt.plot(init.x_left_obs, init.y_left_obs, linestyle='--', label='Obstacle Left Boundary', color='purple')
+    plt.fill_between(init.x_right, init.y_right, init.y_left, color='gray', alpha=0.2)
+    plt.xlabel('X (m)')
+    plt.ylabel('Y (m)')
+    plt.title('Race Track')
+    plt.legend()
+    plt.grid(True)
+    plt.gca().set_aspect('equal', adjustable='box')
+    finish(plt, output)
+
+def plot_path(init, path, label, output=None):
+    # Plot a path found around the track between the track boundaries
+    plt = get_pyplot(output is not None)
+    plt.figure(figsize=(10, 8))
+    plt.plot(init.x_left, init.y_left, label='Track Left Boundary', linestyle='--', color='red')
+    plt.plot(init.x_right, init.y_right, label='Track Right Boundary', linestyle='--', color='green')
+    plt.xlabel('X')
+    plt.ylabel('Y')
+    plt.title('RRT* Path Planning')
+    plt.grid(True)
+    x_path, y_path = zip(*(path))
+    plt.plot(x_path, y_path, 'g-', label=label, linewidth=2)
+    plt.legend()
+    finish(plt, output)
+
+def plot_output(plot_directory, name, plot_format='png'):
+    # File a plot is written to, or None to show it interactively when no directory is given
+    if plot_directory is None:
+        return None
+    return os.path.join(plot_directory, f'{name}.{plot_format}')
+
+def plot_comparison(raceline, path, track_name, output=None):
+    # Plot a generated path over the reference raceline of its track
+    plt = get_pyplot(output is not None)
+    plt.figure(figsize=(14, 7))
+    plt.plot(raceline[:, 0], raceline[:, 1], 'g-', linewidth=2, label='Reference raceline')
+    plt.plot(path[:, 0], path[:, 1], 'r-', linewidth=1, label='Generated path')
+    plt.xlabel('X (m)')
+    plt.ylabel('Y (m)')
+    plt.title(f'Comparison of racelines, {track_name}')
+    plt.legend()
+    plt.grid(True)
+    plt.gca().set_aspect('equal', adjustable='box')
+    finish(plt, output)
@@ -0,0 +1,112 @@
+import numpy as np
+
+def ellipse_axes(focus1, focus2, major):
+    # Semi-axes of the ellipse of points whose distances to both foci sum to at most major
+    focal_distance = np.hypot(focus2[0] - focus1[0], focus2[1] - focus1[1])
+    return major / 2, np.sqrt(max(major**2 - focal_distance**2, 0)) / 2
+
+def ellipse_area(focus1, focus2, major):
+    # Area of the ellipse with the given foci and major axis
+    a, b = ellipse_axes(focus1, focus2, major)
+    return np.pi * a * b
+
+def ellipse_sample(rng, focus1, focus2, major):
+    # Draw a point uniformly from the ellipse with the given foci and major axis
+    a, b = ellipse_axes(focus1, focus2, major)
+    radius = np.sqrt(rng.uniform(0, 1))
+    angle = rng.uniform(-np.pi, np.pi)
+    u, v = a * radius * np.cos(angle), b * radius * np.sin(angle)
+    # Rotate the axis-aligned sample onto the line through the foci and move it to their midpoint
+    heading = np.arctan2(focus2[1] - focus1[1], focus2[0] - focus1[0])
+    x = (focus1[0] + focus2[0]) / 2 + u * np.cos(heading) - v * np.sin(heading)
+    y = (focus1[1] + focus2[1]) / 2 + u * np.sin(heading) + v * np.cos(heading)
+    return (x, y)
+
+def in_ellipse(point, focus1, focus2, major):
+    # Check if the distances from point to both foci sum to at most major
+    return np.hypot(point[0] - focus1[0], point[1] - focus1[1]) + np.hypot(point[0] - focus2[0], point[1] - focus2[1]) <= major
+
+class CorridorSampler:
+    # Draws random points inside the drivable corridor of the track between two centerline indices.
+    # Points are drawn in track-local (Frenet) coordinates, an arc-length station along the centerline
+    # and a lateral offset along the normal, and mapped back to x/y.
+
+    def __init__(self, x, y, nx, ny, w_tr_left, w_tr_right, start, goal, margin=1.5):
+        # x, y: Coordinates of the track centerline
+        # nx, ny: Components of the centerline normal, pointing to the right boundary
+        # w_tr_left, w_tr_right: Width of the track on the left and right side
+        # start, goal: Centerline indices the corridor runs between; goal may be below start to wrap past the end of a closed track,
+        #              and start + len(x) as goal makes the corridor one full lap of a closed track
+        # margin: Safety margin kept from both track boundaries
+        length = len(x)
+        if goal < start:
+            goal += length
+        indices = np.arange(start, goal + 1) % length
+        self.x = np.asarray(x, dtype=float)[indices]
+        self.y = np.asarray(y, dtype=float)[indices]
+        norm = np.hypot(np.asarray(nx, dtype=float)[indices], np.asarray(ny, dtype=float)[indices])
+        self.nx = np.asarray(nx, dtype=float)[indices] / norm
+        self.ny = np.asarray(ny, dtype=float)[indices] / norm
+        self.left = np.maximum(np.asarray(w_tr_left, dtype=float)[indices] - margin, 0)
+        self.right = np.maximum(np.asarray(w_tr_right, dtype=float)[indices] - margin, 0)
+        self.s = np.concatenate(([0], np.cumsum(np.hypot(np.diff(self.x), np.diff(self.y)))))  # station of each centerline point
+        # Outline of the corridor: the left edge forward, then the right edge backward
+        self.polygon = np.concatenate((np.column_stack((self.x - self.left * self.nx, self.y - self.left * self.ny)),
+                                       np.column_stack((self.x + self.right * self.nx, self.y + self.right * self.ny))[::-1]))
+
+    def to_xy(self, station, offset):
+        # Map track-local coordinates to x/y; station is clipped to the corridor, offset is positive to the right
+        station = np.clip(station, 0, self.s[-1])
+        k = np.clip(np.searchsorted(self.s, station, side='right') - 1, 0, len(self.s) - 2)
+        t = (station - self.s[k]) / np.maximum(self.s[k + 1] - self.s[k], 1e-12)
+        center_x = self.x[k] + t * (self.x[k + 1] - self.x[k])
+        center_y = self.y[k] + t * (self.y[k + 1] - self.y[k])
+        normal_x = self.nx[k] + t * (self.nx[k + 1] - self.nx[k])
+        normal_y = self.ny[k] + t * (self.ny[k + 1] - self.ny[k])
+        norm = np.hypot(normal_x, normal_y)
+        return center_x + offset * normal_x / norm, center_y + offset * normal_y / norm
+
+    def half_widths(self, station):
+        # Usable width to the left and to the right of the centerline at the given station
+        return np.interp(station, self.s, self.left), np.interp(station, self.s, self.right)
+
+    def sample(self, rng):
+        # Draw one random point inside the corridor
+        return self.sample_with_station(rng)[0]
+
+    def sample_with_station(self, rng, low=0, high=None):
+        # Draw one random point inside the part of the corridor between stations low and high (the end when None)
+        # and return it with its station
+        station = rng.uniform(low, self.s[-1] if high is None else high)
+        left, right = self.half_widths(station)
+        x, y = self.to_xy(station, rng.uniform(-left, right))
+        return (x, y), station
+
+    def station_of(self, point, near_station, window):
+        # Station of the centerline point nearest to point, searching only the centerline within window of near_station
+        # so that points where the track passes close to itself get the station of the right pass
+        low = int(np.clip(np.searchsorted(self.s, near_station - window, side='right') - 1, 0, len(self.s) - 2))
+        high = int(np.clip(np.searchsorted(self.s, near_station + window), low + 1, len(self.s) - 1))
+        ax, ay = self.x[low:high], self.y[low:high]
+        dx, dy = self.x[low + 1:high + 1] - ax, self.y[low + 1:high + 1] - ay
+        t = np.clip(((point[0] - ax) * dx + (point[1] - ay) * dy) / np.maximum(dx**2 + dy**2, 1e-12), 0, 1)
+        k = int(np.argmin(np.hypot(ax + t * dx - point[0], ay + t * dy - point[1])))
+        return self.s[low + k] + t[k] * (self.s[low + k + 1] - self.s[low + k])
+
+    def contains(self, point):
+        # Check if point lies inside the corridor outline (even-odd rule)
+        px, py = self.polygon[:, 0], self.polygon[:, 1]
+        qx, qy = np.roll(px, -1), np.roll(py, -1)
+        crossing = (py > point[1]) != (qy > point[1])
+        px, py, qx, qy = px[crossing], py[crossing], qx[crossing], qy[crossing]
+        x_cross = px + (point[1] - py) * (qx - px) / (qy - py)
+        return bool(np.count_nonzero(point[0] < x_cross) % 2)
+
+    def area(self):
+        # Approximate area of the corridor
+        widths = self.left + self.right
+        return float(np.sum(np.diff(self.s) * (widths[:-1] + widths[1:]) / 2))
+
+    def bounds(self):
+        # Return (x_low, x_high, y_low, y_high) of a box holding the whole corridor
+        return self.polygon[:, 0].min(), self.polygon[:, 0].max(), self.polygon[:, 1].min(), self.polygon[:, 1].max()
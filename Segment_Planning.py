@@ -0,0 +1,69 @@
+from concurrent.futures import ProcessPoolExecutor
+
+def split_track(length_of_track, segment_count, first_start=0):
+    # Split the centerline indices into consecutive (start, goal) segments, the same way the Main drivers walk the lap
+    segments = []
+    start = first_start
+    serial = 1
+    while True:
+        if serial * (length_of_track // segment_count) < length_of_track - 1:
+            goal = serial * (length_of_track // segment_count)
+            segments.append((start, goal))
+        else:
+            segments.append((start, length_of_track - 1))
+            return segments
+        start = goal
+        serial += 1
+
+def segment_seed(seed, serial, attempt):
+    # Seed for one planning attempt of one segment, derived deterministically from the run seed
+    return None if seed is None else [seed, serial, attempt]
+
+def plan_segment(planner_class, args, kwargs, serial, seed=None, max_attempts=10, planners=None):
+    # Plan one segment, retrying with the next seed until the goal is reached.
+    # Runs inside worker processes, so it only receives picklable arguments.
+    # planners: List every attempt's planner is appended to, None to keep only the last one
+    for attempt in range(max_attempts):
+        planner = planner_class(*args, serial=serial, seed=segment_seed(seed, serial, attempt), **kwargs)
+        planner.build_rrt_star()
+        planner.plot_rrt_star()
+        if planners is not None:
+            planners.append(planner)
+        if planner.reached:
+            break
+    return planner
+
+def plan_segments_parallel(planner_class, make_job, segments, start_points, workers, seed=None, max_attempts=10):
+    # Plan every segment concurrently from its nominal start point, then stitch the segment paths together.
+    # planner_class: Planner to run for each segment
+    # make_job: Function (start, goal, start_point, serial, previous planner or None) -> (args, kwargs) for planner_class
+    # segments: List of (start, goal) centerline indices
+    # start_points: Nominal start point of each segment
+    # workers: Number of worker processes
+    # seed: Run seed from which every segment seed is derived
+    # max_attempts: Planning attempts per segment before giving up
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(plan_segment, planner_class, *make_job(start, goal, start_point, serial, None), serial, seed, max_attempts)
+                   for serial, ((start, goal), start_point) in enumerate(zip(segments, start_points), 1)]
+        planners = [future.result() for future in futures]
+    return stitch_segments(planner_class, make_job, segments, planners, seed, max_attempts)
+
+def stitch_segments(planner_class, make_job, segments, planners, seed=None, max_attempts=10):
+    # Join the segment paths in order. Each segment was planned from its nominal start, while the previous
+    # segment actually ended at its goal_discovered, so connect that point to the first collision-free point
+    # of the next path, or re-plan the next segment from it when no such point exists.
+    path = []
+    for serial, planner in enumerate(planners, 1):
+        if serial > 1:
+            previous = planners[serial - 2]
+            joint = previous.goal_discovered
+            rejoin = next((j for j in range(1, len(planner.path)) if planner.is_collision_free(joint, planner.path[j])), None)
+            if rejoin is None:
+                start, goal = segments[serial - 1]
+                planner = plan_segment(planner_class, *make_job(start, goal, joint, serial, previous), serial, seed, max_attempts)
+                planners[serial - 1] = planner
+                rejoin = 1
+        if not planner.reached:
+            raise RuntimeError(f"Segment {serial} did not reach its goal in {max_attempts} attempts")
+        path += planner.path if serial == 1 else planner.path[rejoin:]
+    return path, planners
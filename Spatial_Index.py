@@ -0,0 +1,138 @@
+import numpy as np
+
+class BruteForceIndex:
+    # Exact nearest-neighbour index that scans every stored point (reference mode)
+
+    def __init__(self, capacity=1024):
+        # capacity: Initial number of points the index can hold before growing
+        self.points = np.empty((capacity, 2))
+        self.size = 0
+        self.queries = 0  # Number of nearest and within_radius lookups answered
+
+    def insert(self, point):
+        # Add a point to the index and return its id (ids follow insertion order)
+        if self.size == len(self.points):
+            self.points = np.concatenate((self.points, np.empty_like(self.points)))
+        self.points[self.size] = point
+        self.size += 1
+        return self.size - 1
+
+    def nearest(self, point):
+        # Return the id of the stored point closest to the given point
+        self.queries += 1
+        return self.scan_nearest(point)
+
+    def within_radius(self, point, radius):
+        # Return the ids (in insertion order) of all stored points within radius of the given point
+        self.queries += 1
+        return self.scan_within_radius(point, radius)
+
+    def scan_nearest(self, point):
+        # Id of the stored point closest to the given point, scanning every stored point
+        delta = self.points[:self.size] - point
+        return int(np.argmin(np.einsum('ij,ij->i', delta, delta)))
+
+    def scan_within_radius(self, point, radius):
+        # Ids (in insertion order) of the stored points within radius of the given point, scanning every stored point
+        delta = self.points[:self.size] - point
+        return np.flatnonzero(np.einsum('ij,ij->i', delta, delta) <= radius * radius)
+
+
+class GridIndex(BruteForceIndex):
+    # Nearest-neighbour index that buckets points into a uniform grid of square cells,
+    # so queries only look at the cells around the query point
+
+    def __init__(self, cell_size=50, capacity=1024):
+        # cell_size: Side length of a grid cell, ideally close to the typical query radius
+        super().__init__(capacity)
+        self.cell_size = cell_size
+        self.cells = {}
+        self.cell_min = None
+        self.cell_max = None
+
+    def cell_of(self, point):
+        # Return the (column, row) of the grid cell containing the given point
+        return int(np.floor(point[0] / self.cell_size)), int(np.floor(point[1] / self.cell_size))
+
+    def insert(self, point):
+        # Add a point to the index and register it with its grid cell
+        point_id = super().insert(point)
+        cell = self.cell_of(point)
+        self.cells.setdefault(cell, []).append(point_id)
+        if self.cell_min is None:
+            self.cell_min = list(cell)
+            self.cell_max = list(cell)
+        else:
+            self.cell_min = [min(self.cell_min[0], cell[0]), min(self.cell_min[1], cell[1])]
+            self.cell_max = [max(self.cell_max[0], cell[0]), max(self.cell_max[1], cell[1])]
+        return point_id
+
+    def ring(self, center, r):
+        # Return the ids stored in the square ring of cells at Chebyshev distance r from center
+        ci, cj = center
+        if r == 0:
+            return list(self.cells.get(center, ()))
+        ids = []
+        for i in range(ci - r, ci + r + 1):
+            ids.extend(self.cells.get((i, cj - r), ()))
+            ids.extend(self.cells.get((i, cj + r), ()))
+        for j in range(cj - r + 1, cj + r):
+            ids.extend(self.cells.get((ci - r, j), ()))
+            ids.extend(self.cells.get((ci + r, j), ()))
+        return ids
+
+    def nearest(self, point):
+        # Search rings of cells outwards until no unvisited cell can hold a closer point
+        self.queries += 1
+        center = self.cell_of(point)
+        # Rings needed to cover every occupied cell; beyond that a full scan is cheaper
+        max_ring = max(abs(center[0] - self.cell_min[0]), abs(center[0] - self.cell_max[0]),
+                       abs(center[1] - self.cell_min[1]), abs(center[1] - self.cell_max[1]))
+        if (2 * max_ring + 1) ** 2 > max(len(self.cells), 9) * 4:
+            return self.scan_nearest(point)
+        best_id = -1
+        best_distance = np.inf
+        for r in range(max_ring + 1):
+            ids = self.ring(center, r)
+            if ids:
+                delta = self.points[ids] - point
+                distances = np.einsum('ij,ij->i', delta, delta)
+                k = int(np.argmin(distances))
+                if distances[k] < best_distance or (distances[k] == best_distance and ids[k] < best_id):
+                    best_distance = distances[k]
+                    best_id = ids[k]
+            # Every cell in ring r + 1 is at least r cells away from the query point
+            if best_id >= 0 and best_distance < (r * self.cell_size) ** 2:
+                break
+        return int(best_id)
+
+    def within_radius(self, point, radius):
+        # Return the ids (in insertion order) of all stored points within radius of the given point
+        self.queries += 1
+        i_low, j_low = self.cell_of((point[0] - radius, point[1] - radius))
+        i_high, j_high = self.cell_of((point[0] + radius, point[1] + radius))
+        if (i_high - i_low + 1) * (j_high - j_low + 1) > len(self.cells):
+            return self.scan_within_radius(point, radius)
+        ids = []
+        for i in range(i_low, i_high + 1):
+            for j in range(j_low, j_high + 1):
+                ids.extend(self.cells.get((i, j), ()))
+        if not ids:
+            return np.empty(0, dtype=int)
+        ids = np.array(ids)
+        delta = self.points[ids] - point
+        return np.sort(ids[np.einsum('ij,ij->i', delta, delta) <= radius * radius])
+
+
+NEAREST_NEIGHBOUR_INDEXES = {
+    'brute': BruteForceIndex,
+    'grid': GridIndex,
+}
+
+def make_index(kind='grid', cell_size=50):
+    # Create a nearest-neighbour index by name ('grid' or the exact 'brute' reference)
+    if kind not in NEAREST_NEIGHBOUR_INDEXES:
+        raise ValueError(f"Unknown nearest-neighbour index '{kind}', expected one of {sorted(NEAREST_NEIGHBOUR_INDEXES)}")
+    if kind == 'grid':
+        return GridIndex(cell_size=cell_size)
+    return NEAREST_NEIGHBOUR_INDEXES[kind]()
@@ -0,0 +1,119 @@
+import glob
+import hashlib
+import os
+import re
+
+import numpy as np
+
+from Collision_Checker import CollisionChecker, ObstacleSet
+from Path_IO import mapped_arrays, write_atomically
+
+# Compiled tracks: everything Initialization derives from a track CSV (normals, boundaries, obstacle boundaries,
+# arc length, the collision grid and the range tables behind the bounding box queries) is computed once and
+# stored as an uncompressed .npz file named after the track and a hash of the CSV. Later runs map that file into
+# memory instead of parsing and recomputing, and a changed CSV gets a new hash and is compiled again.
+
+CACHE_DIRECTORY = './Data/track_cache'
+FORMAT_VERSION = 1  # Version of the compiled track layout, older files are compiled again
+CSV_COLUMNS = ('x_m', 'y_m', 'w_tr_right_m', 'w_tr_left_m')
+OBSTACLE_OFFSET = 1  # Distance of the obstacle boundaries inside the track boundaries
+COLLISION_CELL_SIZE = 20  # Grid cell size of the stored collision checker
+CACHE_NAME = re.compile(r'(?P<track>.+)_(?P<hash>[0-9a-f]{16})\.npz')
+
+def source_hash(track_path):
+    # Hash of the contents of the track CSV file
+    with open(track_path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()[:16]
+
+def read_track_csv(track_path):
+    # Centerline x and y and the right and left track widths of a track CSV file, found by their column names
+    with open(track_path, encoding='utf-8') as file:
+        names = [name.strip() for name in file.readline().lstrip('#').split(',')]
+    missing = [column for column in CSV_COLUMNS if column not in names]
+    if missing:
+        raise ValueError(f"{track_path} has no column {', '.join(missing)}")
+    data = np.loadtxt(track_path, delimiter=',', skiprows=1, ndmin=2, encoding='utf-8')
+    return [data[:, names.index(column)] for column in CSV_COLUMNS]
+
+def sparse_table(values, reduce):
+    # Sparse table of values under reduce (np.minimum or np.maximum): row k holds reduce over values[i:i + 2**k]
+    # for every i with i + 2**k <= len(values), the other entries of the row are unused
+    rows = [np.asarray(values, dtype=float)]
+    span = 1
+    while 2 * span <= len(values):
+        row = rows[-1].copy()
+        row[:len(values) - span] = reduce(rows[-1][:-span], rows[-1][span:])
+        rows.append(row)
+        span *= 2
+    return np.stack(rows)
+
+def range_query(table, start, stop, reduce):
+    # reduce (min or max) over values[start:stop] in constant time, from two overlapping rows of a sparse table.
+    # start and stop may be numpy integers, as the indices the drivers compute often are.
+    start, stop = int(start), int(stop)
+    if not 0 <= start < stop:
+        raise ValueError(f"Empty or negative index range {start}:{stop}")
+    stop = min(stop, table.shape[1])
+    level = (stop - start).bit_length() - 1
+    return reduce(table[level, start], table[level, stop - (1 << level)])
+
+def compile_track(track_path):
+    # Arrays of the compiled track
+    x, y, w_tr_right, w_tr_left = read_track_csv(track_path)
+    # Track normals from the gradient of the centerline, and the boundaries along them
+    dx = np.gradient(x)
+    dy = np.gradient(y)
+    norm = np.sqrt(dx**2 + dy**2)
+    nx = dy / norm
+    ny = -dx / norm
+    x_right = x + w_tr_right * nx
+    y_right = y + w_tr_right * ny
+    x_left = x - w_tr_left * nx
+    y_left = y - w_tr_left * ny
+    x_right_obs = x + (w_tr_right - OBSTACLE_OFFSET) * nx
+    y_right_obs = y + (w_tr_right - OBSTACLE_OFFSET) * ny
+    x_left_obs = x - (w_tr_left - OBSTACLE_OFFSET) * nx
+    y_left_obs = y - (w_tr_left - OBSTACLE_OFFSET) * ny
+    spacing = np.hypot(np.diff(x), np.diff(y))
+    # The track is a closed circuit when its last centerline point lies about one point spacing from the first
+    closed = np.hypot(x[-1] - x[0], y[-1] - y[0]) <= 2 * np.median(spacing)
+    obstacles = ObstacleSet([(np.column_stack((x_left_obs, y_left_obs)), closed), (np.column_stack((x_right_obs, y_right_obs)), closed)])
+    checker = CollisionChecker.from_obstacles(obstacles, cell_size=COLLISION_CELL_SIZE)
+    origin, shape, cell_segments, cell_offsets = checker.grid_arrays()
+    return dict(
+        version=np.array(FORMAT_VERSION), x=x, y=y, w_tr_right=w_tr_right, w_tr_left=w_tr_left, nx=nx, ny=ny,
+        x_right=x_right, y_right=y_right, x_left=x_left, y_left=y_left,
+        x_right_obs=x_right_obs, y_right_obs=y_right_obs, x_left_obs=x_left_obs, y_left_obs=y_left_obs,
+        arc_length=np.concatenate(([0.0], np.cumsum(spacing))), closed=np.array(closed),
+        grid_origin=origin, grid_shape=np.array(shape), grid_cell_segments=cell_segments, grid_cell_offsets=cell_offsets,
+        # Range tables over the bounding box of both track boundaries at every centerline point
+        x_low_table=sparse_table(np.minimum(x_left, x_right), np.minimum), x_high_table=sparse_table(np.maximum(x_left, x_right), np.maximum),
+        y_low_table=sparse_table(np.minimum(y_left, y_right), np.minimum), y_high_table=sparse_table(np.maximum(y_left, y_right), np.maximum),
+    )
+
+def cache_file(track_path, cache_directory=CACHE_DIRECTORY):
+    # Compiled track file of the current contents of the track CSV file
+    track_name = os.path.basename(track_path).split('.')[0]
+    return os.path.join(cache_directory, f'{track_name}_{source_hash(track_path)}.npz')
+
+def remove_stale(file_path):
+    # Remove the compiled files of earlier contents of the same track
+    track_name = CACHE_NAME.fullmatch(os.path.basename(file_path)).group('track')
+    for other in glob.glob(os.path.join(glob.escape(os.path.dirname(file_path)), f'{glob.escape(track_name)}_*.npz')):
+        match = CACHE_NAME.fullmatch(os.path.basename(other))
+        if other != file_path and match and match.group('track') == track_name:
+            os.remove(other)
+
+def load_track(track_path, cache_directory=CACHE_DIRECTORY):
+    # Arrays of the compiled track by name, compiling and storing it first when it has no current compiled file.
+    # Every array is mapped read-only into memory; copy those that are to be changed.
+    file_path = cache_file(track_path, cache_directory)
+    if os.path.exists(file_path):
+        arrays = mapped_arrays(file_path)
+        if int(arrays['version']) == FORMAT_VERSION:
+            return {name: array.view(np.ndarray) for name, array in arrays.items()}
+    arrays = compile_track(track_path)
+    os.makedirs(cache_directory, exist_ok=True)
+    write_atomically(file_path, lambda file: np.savez(file, **arrays))
+    remove_stale(file_path)
+    return arrays
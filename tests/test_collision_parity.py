@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from Collision_Checker import CollisionChecker, do_segments_intersect, segments_intersect, segments_intersect_matrix
+
+# The vectorized intersection kernels and the broad-phase checker must give exactly the results of the scalar
+# do_segments_intersect, including the collinear and touching cases that integer coordinates produce often.
+
+def random_segments(rng, count, integer):
+    # (count, 2) start and end points, on a small integer grid or as floats
+    if integer:
+        return rng.integers(-4, 5, (count, 2)).astype(float), rng.integers(-4, 5, (count, 2)).astype(float)
+    return rng.uniform(-50, 50, (count, 2)), rng.uniform(-50, 50, (count, 2))
+
+def scalar_mask(p3, p4, starts, ends):
+    # do_segments_intersect of the query segment against every segment
+    return np.array([do_segments_intersect(start, end, p3, p4) for start, end in zip(starts, ends)], dtype=bool)
+
+@pytest.mark.parametrize('integer', [False, True])
+@pytest.mark.parametrize('seed', range(5))
+def test_segments_intersect_matches_scalar(seed, integer):
+    rng = np.random.default_rng(seed)
+    starts, ends = random_segments(rng, 200, integer)
+    for _ in range(30):
+        p3, p4 = (point[0] for point in random_segments(rng, 1, integer))
+        assert np.array_equal(segments_intersect(p3, p4, starts, ends), scalar_mask(p3, p4, starts, ends))
+
+@pytest.mark.parametrize('case', [
+    # (query start, query end, segment start, segment end, expected)
+    ((0, 0), (4, 0), (2, 0), (6, 0), True),  # collinear overlap
+    ((0, 0), (2, 0), (2, 0), (4, 0), True),  # collinear, touching end to end
+    ((0, 0), (1, 0), (2, 0), (4, 0), False),  # collinear, apart
+    ((0, 0), (4, 0), (2, 0), (2, 3), True),  # segment end on the query
+    ((0, 0), (4, 0), (2, 1), (2, 3), False),  # segment ending short of the query
+    ((2, 0), (2, 3), (0, 0), (4, 0), True),  # query end on the segment
+    ((0, 0), (4, 4), (0, 4), (4, 0), True),  # proper crossing
+    ((1, 1), (1, 1), (0, 0), (2, 2), True),  # zero-length query on the segment
+    ((0, 0), (0, 0), (1, 1), (2, 2), False),  # zero-length query beside the segment
+])
+def test_segments_intersect_special_cases(case):
+    p3, p4, start, end, expected = case
+    starts, ends = np.array([start], dtype=float), np.array([end], dtype=float)
+    assert do_segments_intersect(start, end, p3, p4) == expected
+    assert segments_intersect(p3, p4, starts, ends)[0] == expected
+
+@pytest.mark.parametrize('integer', [False, True])
+def test_matrix_matches_scalar(integer):
+    rng = np.random.default_rng(7)
+    starts, ends = random_segments(rng, 60, integer)
+    query_starts, query_ends = random_segments(rng, 40, integer)
+    matrix = segments_intersect_matrix(query_starts, query_ends, starts, ends)
+    assert matrix.shape == (40, 60)
+    expected = np.array([scalar_mask(p3, p4, starts, ends) for p3, p4 in zip(query_starts, query_ends)])
+    assert np.array_equal(matrix, expected)
+
+def obstacle_segments(rng):
+    # Segments of a jagged closed loop, the kind of boundary the checker is built over
+    angles = np.sort(rng.uniform(0, 2 * np.pi, 300))
+    radii = rng.uniform(80, 120, 300)
+    points = np.column_stack((radii * np.cos(angles), radii * np.sin(angles)))
+    return points, np.roll(points, -1, axis=0)
+
+@pytest.mark.parametrize('scalar_limit', [0, 8, 10000])
+def test_checker_matches_full_scan(scalar_limit):
+    # scalar_limit 0 sends every query through the array kernel, 10000 every query through the scalar loop
+    rng = np.random.default_rng(11)
+    starts, ends = obstacle_segments(rng)
+    checker = CollisionChecker(starts, ends, cell_size=20, scalar_limit=scalar_limit)
+    points1 = rng.uniform(-140, 140, (400, 2))
+    # Short and long edges, so that both few and many candidate segments are tested
+    points2 = points1 + rng.normal(0, 1, (400, 2)) * np.repeat([[5.0], [80.0]], 200, axis=0)
+    expected = np.array([scalar_mask(p1, p2, starts, ends).any() for p1, p2 in zip(points1, points2)])
+    assert np.array_equal([checker.is_intersecting(p1, p2) for p1, p2 in zip(points1, points2)], expected)
+    assert np.array_equal(checker.intersecting_mask(points1, points2), expected)
+
+def test_checker_shared_end_point_matches_full_scan():
+    rng = np.random.default_rng(12)
+    starts, ends = obstacle_segments(rng)
+    checker = CollisionChecker(starts, ends)
+    points1 = rng.uniform(-140, 140, (200, 2))
+    point2 = np.array([95.0, 10.0])
+    expected = np.array([scalar_mask(p1, point2, starts, ends).any() for p1 in points1])
+    assert np.array_equal(checker.intersecting_mask(points1, point2), expected)
+    assert len(checker.intersecting_mask(np.empty((0, 2)), point2)) == 0
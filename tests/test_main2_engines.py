@@ -0,0 +1,24 @@
+import os
+import time
+
+import pytest
+
+import Main2
+from Initialization import Initialization
+
+# Smoke test of every Main2 engine over a short track: each planner attempt keeps to its iteration budget,
+# so a whole lap plans in seconds instead of running every segment planner for RRTStar's default budget.
+
+TRACK_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data', 'racetrack-database', 'tracks', 'Norisring.csv')
+TIME_LIMIT = 60  # Seconds a lap may take; the lap plans in about 5 s on one core
+
+@pytest.mark.parametrize('engine', sorted(Main2.ENGINES))
+def test_lap_plans_within_budget(engine, tmp_path):
+    init = Initialization(TRACK_PATH, cache_directory=str(tmp_path))
+    planners = []
+    started = time.perf_counter()
+    path = Main2.plan_lap(init, seed=1, engine=engine, planners=planners, export_segments=False)
+    assert time.perf_counter() - started < TIME_LIMIT
+    assert len(path) > 1 and all(planner.reached for planner in planners[-1:])
+    if engine != 'rrt_star_lap':
+        assert max(planner.iteration + 1 for planner in planners) <= Main2.SEGMENT_MAX_ITER